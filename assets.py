@@ -0,0 +1,18 @@
+import pygame
+
+
+class AssetCache:
+    # Images decoded once per path and shared by every animation built from
+    # them. Needs a display mode for convert_alpha.
+    def __init__(self):
+        self.sources = {}
+
+    def source(self, path):
+        image = self.sources.get(path)
+        if image is None:
+            image = pygame.image.load(path).convert_alpha()
+            self.sources[path] = image
+        return image
+
+
+assets = AssetCache()
@@ -0,0 +1,125 @@
+import numpy as np
+import pygame
+
+from assets import assets
+
+# Animations are either a row of frames sliced out of a sprite sheet or a list
+# of separate image files. A row starts at `origin` with frames of `size`
+# every `stride` pixels. Sheets drawn on a flat background knock it out to
+# transparent within `tolerance` per channel.
+ANIMATIONS = {
+    "player": {
+        "frames": [
+            "resources/player1.png",
+            "resources/player2.png",
+            "resources/player3.png",
+            "resources/player2.png",
+        ],
+    },
+    "enemy": {
+        "sheet": "potential_assets/enemy_sprite_sheet.png",
+        "origin": (112, 720),
+        "size": (118, 118),
+        "stride": (125.7, 0),
+        "count": 7,
+        "background": (236, 246, 253),
+        "tolerance": 24,
+    },
+}
+
+
+class Animation:
+    # Every frame of one animation at one size, side by side in one texture
+    def __init__(self, texture, rects):
+        self.texture = texture
+        self.rects = rects
+
+    def __len__(self):
+        return len(self.rects)
+
+    def draw(self, screen, frame, position):
+        screen.blit(self.texture, position, self.rects[frame])
+
+
+def edge_connected(mask):
+    # The part of mask reachable from the frame's border, grown one pixel a
+    # step, so light areas inside a sprite are not mistaken for background
+    region = np.zeros_like(mask)
+    for edge in (np.s_[0, :], np.s_[-1, :], np.s_[:, 0], np.s_[:, -1]):
+        region[edge] = mask[edge]
+    while True:
+        grown = region.copy()
+        grown[1:] |= region[:-1]
+        grown[:-1] |= region[1:]
+        grown[:, 1:] |= region[:, :-1]
+        grown[:, :-1] |= region[:, 1:]
+        grown &= mask
+        if (grown == region).all():
+            return region
+        region = grown
+
+
+def knock_out(frame, background, tolerance):
+    rgb = pygame.surfarray.pixels3d(frame)
+    alpha = pygame.surfarray.pixels_alpha(frame)
+    distance = np.abs(rgb.astype(np.int16) - background).max(axis=2)
+    alpha[edge_connected(distance <= tolerance)] = 0
+    del rgb, alpha
+
+
+def source_frames(spec):
+    if "frames" in spec:
+        return [assets.source(path) for path in spec["frames"]]
+
+    sheet = assets.source(spec["sheet"])
+    x, y = spec["origin"]
+    width, height = spec["size"]
+    step_x, step_y = spec["stride"]
+    frames = []
+    for i in range(spec["count"]):
+        rect = pygame.Rect(round(x + step_x * i), round(y + step_y * i), width, height)
+        frame = sheet.subsurface(rect).copy()
+        if "background" in spec:
+            knock_out(frame, spec["background"], spec["tolerance"])
+        frames.append(frame)
+    return frames
+
+
+class SpriteAtlas:
+    # Builds each animation once per target size: the frames are sliced,
+    # scaled and packed into a single strip drawn with area blits.
+    def __init__(self, animations=ANIMATIONS):
+        self.animations = animations
+        self.strips = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, size):
+        key = (name, size)
+        animation = self.strips.get(key)
+        if animation is None:
+            self.misses += 1
+            animation = self.build(self.animations[name], size)
+            self.strips[key] = animation
+        else:
+            self.hits += 1
+        return animation
+
+    def build(self, spec, size):
+        frames = source_frames(spec)
+        width, height = size
+        texture = pygame.Surface((width * len(frames), height), pygame.SRCALPHA)
+        rects = []
+        for i, frame in enumerate(frames):
+            rect = pygame.Rect(width * i, 0, width, height)
+            texture.blit(pygame.transform.smoothscale(frame, size), rect)
+            rects.append(rect)
+        return Animation(texture.convert_alpha(), rects)
+
+    def preload(self, names, size):
+        for name in names:
+            if (name, size) not in self.strips:
+                self.strips[(name, size)] = self.build(self.animations[name], size)
+
+
+atlas = SpriteAtlas()
@@ -0,0 +1,47 @@
+import math
+
+import pygame
+
+GRID_SPACING = 50
+
+
+class Background:
+    # The world background repeats every tile, so it is rendered once into a
+    # layer one tile larger than the screen and blitted with the camera offset
+    # wrapped to the tile. The layer is rebuilt if the screen size changes.
+    def __init__(self, color, line_color, tile_size=GRID_SPACING):
+        self.color = color
+        self.line_color = line_color
+        self.tile_size = tile_size
+        self.layer = None
+        self.size = None
+
+    def draw_tile(self, tile):
+        # One period of the background, with the grid lines on its top and
+        # left edges. Terrain or decorations would be drawn here as well.
+        tile.fill(self.color)
+        pygame.draw.line(tile, self.line_color, (0, 0), (0, self.tile_size))
+        pygame.draw.line(tile, self.line_color, (0, 0), (self.tile_size, 0))
+
+    def build(self, size):
+        tile = pygame.Surface((self.tile_size, self.tile_size)).convert()
+        self.draw_tile(tile)
+
+        width = size[0] + self.tile_size
+        height = size[1] + self.tile_size
+        self.layer = pygame.Surface((width, height)).convert()
+        for x in range(0, width, self.tile_size):
+            for y in range(0, height, self.tile_size):
+                self.layer.blit(tile, (x, y))
+        self.size = size
+
+    def draw(self, screen, offset_x, offset_y):
+        if screen.get_size() != self.size:
+            self.build(screen.get_size())
+        screen.blit(
+            self.layer,
+            (
+                -(math.ceil(offset_x) % self.tile_size),
+                -(math.ceil(offset_y) % self.tile_size),
+            ),
+        )
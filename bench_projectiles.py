@@ -0,0 +1,129 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from projectiles import ProjectilePool
+from spatial import SpatialHash
+
+PLAYER_SIZE = 100
+WORLD_SIZE = 5000
+FRAME_TIME = 1 / 60
+
+
+class LegacyProjectile:
+    def __init__(self, x, y, velocity, owner):
+        self.x = x
+        self.y = y
+        self.velocity = velocity
+        self.owner = owner
+
+    def move(self, dt):
+        self.x += self.velocity[0] * dt
+        self.y += self.velocity[1] * dt
+
+
+class LegacyPlayer:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.size = PLAYER_SIZE
+        self.health = 100
+
+
+def spawn(count, seed):
+    rng = random.Random(seed)
+    spawned = []
+    for _ in range(count):
+        angle = rng.uniform(0, 6.283)
+        spawned.append(
+            (
+                rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                [400 * np.cos(angle), 400 * np.sin(angle)],
+                "enemy" if rng.random() < 0.5 else "player",
+            )
+        )
+    return spawned
+
+
+def legacy_tick(projectiles, players):
+    # The server loop as it was before ProjectilePool, removal quirk included
+    for projectile in projectiles:
+        projectile.move(FRAME_TIME)
+
+        if projectile.owner == "enemy":
+            for player in players:
+                if (
+                    player.x < projectile.x < player.x + player.size
+                    and player.y < projectile.y < player.y + player.size
+                ):
+                    player.health -= 10
+                    projectiles.remove(projectile)
+                    break
+
+
+def pool_tick(pool, boxes, sizes, players):
+    pool.move(FRAME_TIME)
+    grid = SpatialHash()
+    for i, player in enumerate(players):
+        grid.insert(
+            i, player.x, player.y, player.x + player.size, player.y + player.size
+        )
+    hit, player_indices = pool.hits(grid, boxes, sizes, True)
+    pool.kill(hit)
+    for i in player_indices.tolist():
+        players[i].health -= 10
+    pool.compact()
+
+
+def bench(count, player_count, ticks):
+    rng = random.Random(count)
+    players = [
+        LegacyPlayer(
+            rng.uniform(-WORLD_SIZE, WORLD_SIZE), rng.uniform(-WORLD_SIZE, WORLD_SIZE)
+        )
+        for _ in range(player_count)
+    ]
+    spawned = spawn(count, count)
+
+    legacy = [LegacyProjectile(*projectile) for projectile in spawned]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        legacy_tick(legacy, players)
+    legacy_time = (time.perf_counter() - start) / ticks
+
+    pool = ProjectilePool()
+    for i, (x, y, velocity, owner) in enumerate(spawned):
+        pool.add(i, x, y, velocity, 0, owner == "enemy")
+    boxes = np.array([(player.x, player.y) for player in players])
+    sizes = np.array([player.size for player in players])
+    start = time.perf_counter()
+    for _ in range(ticks):
+        pool_tick(pool, boxes, sizes, players)
+    pool_time = (time.perf_counter() - start) / ticks
+
+    return legacy_time, pool_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the list-based projectile loop with ProjectilePool"
+    )
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--players", type=int, default=32)
+    parser.add_argument("--ticks", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'projectiles':>12} {'legacy ms':>10} {'pool ms':>10} {'speedup':>8}")
+    for count in args.counts:
+        legacy_time, pool_time = bench(count, args.players, args.ticks)
+        print(
+            f"{count:>12} {legacy_time * 1000:>10.2f} {pool_time * 1000:>10.2f} "
+            f"{legacy_time / pool_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from movement import INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_UP
+from profiler import TickProfiler
+from protocol import PROTOCOL_VERSION
+from scheduler import SNAPSHOT_RATE, TICK_RATE
+from server import PROJECTILE_SPEED, GameServer
+
+# Bots wander inside this square around the origin; the server drops
+# projectiles more than 1000 away from the first player
+ARENA = 800
+TURN_CHANCE = 0.05
+KEYS = [
+    0,
+    INPUT_UP,
+    INPUT_DOWN,
+    INPUT_LEFT,
+    INPUT_RIGHT,
+    INPUT_UP | INPUT_LEFT,
+    INPUT_UP | INPUT_RIGHT,
+    INPUT_DOWN | INPUT_LEFT,
+    INPUT_DOWN | INPUT_RIGHT,
+]
+BASELINE_VERSION = 1
+
+# Compared against a baseline, with True where a higher value is better
+METRICS = {
+    "ticks_per_s": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "bytes_per_snapshot": False,
+    "alloc_kb_per_tick": False,
+}
+
+
+class Bot:
+    # Scripted client on one in-process channel: wanders the arena holding
+    # random keys, sends a move every tick and acks every snapshot at once
+    def __init__(self, channel, rng, name, protocol):
+        self.channel = channel
+        self.rng = rng
+        self.keys = 0
+        self.seq = 0
+        channel.receive({"action": "hello", "protocol": protocol, "name": name})
+
+    def steer(self):
+        player = self.channel.player
+        keys = 0
+        if player.x < -ARENA:
+            keys |= INPUT_RIGHT
+        elif player.x > ARENA:
+            keys |= INPUT_LEFT
+        if player.y < -ARENA:
+            keys |= INPUT_DOWN
+        elif player.y > ARENA:
+            keys |= INPUT_UP
+
+        if keys:
+            self.keys = keys
+        elif self.rng.random() < TURN_CHANCE:
+            self.keys = self.rng.choice(KEYS)
+
+    def update(self, dt, laser_rate):
+        self.steer()
+        self.seq += 1
+        self.channel.receive(
+            {
+                "action": "move",
+                "seq": self.seq,
+                "keys": self.keys,
+                "dt": round(dt * 1000),
+            }
+        )
+        if self.rng.random() < laser_rate * dt:
+            player = self.channel.player
+            self.channel.receive(
+                {
+                    "action": "laser_beam",
+                    "x": player.x,
+                    "y": player.y,
+                    "angle": self.rng.uniform(0, 2 * math.pi),
+                    "name": player.name,
+                }
+            )
+
+    def shoot(self):
+        player = self.channel.player
+        angle = self.rng.uniform(0, 2 * math.pi)
+        self.channel.receive(
+            {
+                "action": "projectile",
+                "x": player.x,
+                "y": player.y,
+                "velocity": [
+                    PROJECTILE_SPEED * math.cos(angle),
+                    PROJECTILE_SPEED * math.sin(angle),
+                ],
+                "name": player.name,
+            }
+        )
+
+    def ack(self, seq):
+        self.channel.receive({"action": "ack", "seq": seq})
+
+
+def top_up(server, bots, target, rng):
+    # Keeps about `target` projectiles alive, half fired by the bots and half
+    # hostile ones standing in for a large enemy wave
+    for i in range(target - len(server.projectiles)):
+        if i % 2:
+            rng.choice(bots).shoot()
+            continue
+        angle = rng.uniform(0, 2 * math.pi)
+        server.add_projectile(
+            rng.uniform(-ARENA, ARENA),
+            rng.uniform(-ARENA, ARENA),
+            [PROJECTILE_SPEED * math.cos(angle), PROJECTILE_SPEED * math.sin(angle)],
+            0,
+            True,
+        )
+
+
+def step(server, bots, projectiles, laser_rate, tick, rng):
+    # One server tick with its inputs; returns the time spent in the server
+    dt = 1 / TICK_RATE
+    for bot in bots:
+        bot.update(dt, laser_rate)
+    top_up(server, bots, projectiles, rng)
+
+    start = time.perf_counter()
+    server.Pump()
+    server.simulate(dt)
+    snapshot = tick % round(TICK_RATE / SNAPSHOT_RATE) == 0
+    if snapshot:
+        server.send_snapshot()
+    elapsed = time.perf_counter() - start
+
+    if snapshot:
+        for bot in bots:
+            bot.ack(server.seq)
+    return elapsed
+
+
+def bench(players, projectiles, laser_rate, args):
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = GameServer(transport="local", enemy_count=args.enemies)
+        bots = [
+            Bot(server.transport.connect(), rng, f"bot{i}", args.protocol)
+            for i in range(players)
+        ]
+    server.enemies.rng = np.random.default_rng(args.seed)
+
+    tick = 0
+    for _ in range(args.warmup):
+        step(server, bots, projectiles, laser_rate, tick, rng)
+        tick += 1
+
+    server.transport.Pump()
+    channels = server.transport.channels
+    bytes_before = sum(channel.bytes_sent for channel in channels)
+    seq_before = server.seq
+    server.profiler = TickProfiler(
+        1 / TICK_RATE, window=args.ticks, log=lambda message: None
+    )
+    server.profiler.enabled = True
+
+    latencies = []
+    for _ in range(args.ticks):
+        latencies.append(step(server, bots, projectiles, laser_rate, tick, rng))
+        tick += 1
+    server.transport.Pump()
+    bytes_sent = sum(channel.bytes_sent for channel in channels) - bytes_before
+    snapshots = server.seq - seq_before
+    phases = {
+        name: values[0] * 1000
+        for name, values in server.profiler.summary(server.profiler.timings).items()
+    }
+
+    # Allocations are traced in a separate, shorter pass since tracemalloc
+    # slows everything down
+    server.profiler.enabled = False
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    allocated = []
+    for _ in range(args.alloc_ticks):
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(server, bots, projectiles, laser_rate, tick, rng)
+        tick += 1
+        allocated.append(tracemalloc.get_traced_memory()[1] - size)
+    end_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+    return {
+        "players": players,
+        "projectiles": projectiles,
+        "laser_rate": laser_rate,
+        "ticks": args.ticks,
+        "ticks_per_s": len(latencies) / sum(latencies),
+        "p50_ms": p50 * 1000,
+        "p95_ms": p95 * 1000,
+        "p99_ms": p99 * 1000,
+        "max_ms": max(latencies) * 1000,
+        "snapshots": snapshots,
+        "bytes_per_snapshot": bytes_sent / max(snapshots, 1),
+        "bytes_per_s": bytes_sent * TICK_RATE / args.ticks,
+        "alloc_kb_per_tick": np.mean(allocated) / 1024 if allocated else 0,
+        "retained_kb": (end_size - start_size) / 1024,
+        "phases_p50_ms": phases,
+    }
+
+
+def scenario_key(result):
+    return (result["players"], result["projectiles"], result["laser_rate"])
+
+
+def print_results(results):
+    print(
+        f"{'players':>7} {'projectiles':>11} {'lasers/s':>8} {'ticks/s':>8} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'KB/snap':>8} {'alloc KB':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['players']:>7} {result['projectiles']:>11} "
+            f"{result['laser_rate']:>8g} {result['ticks_per_s']:>8.0f} "
+            f"{result['p50_ms']:>7.3f} {result['p95_ms']:>7.3f} "
+            f"{result['p99_ms']:>7.3f} {result['bytes_per_snapshot'] / 1024:>8.1f} "
+            f"{result['alloc_kb_per_tick']:>8.1f}"
+        )
+
+
+def compare(results, baseline, threshold):
+    # Returns the number of metrics worse than the baseline by more than
+    # `threshold` percent
+    previous = {scenario_key(result): result for result in baseline["results"]}
+    regressions = 0
+    print(
+        f"{'scenario':<16} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}"
+    )
+    for result in results:
+        old = previous.get(scenario_key(result))
+        if old is None:
+            continue
+        scenario = "{}p {}x {:g}l".format(*scenario_key(result))
+        for metric, higher_is_better in METRICS.items():
+            if metric not in old or not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            print(
+                f"{scenario:<16} {metric:<20} {old[metric]:>10.3f} "
+                f"{result[metric]:>10.3f} {change:>+7.1f}%{flag}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the server tick with in-process scripted clients"
+    )
+    parser.add_argument("--players", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--projectiles", type=int, nargs="+", default=[0, 1000, 10000])
+    parser.add_argument(
+        "--laser-rates",
+        type=float,
+        nargs="+",
+        default=[0, 2],
+        help="laser beams fired per second by each player",
+    )
+    parser.add_argument("--enemies", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--alloc-ticks", type=int, default=60)
+    parser.add_argument("--protocol", type=int, default=PROTOCOL_VERSION)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument(
+        "--load", help="read the results from this JSON file instead of running"
+    )
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10,
+        help="percent change counted as a regression",
+    )
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load) as f:
+            run = json.load(f)
+    else:
+        results = []
+        for players, projectiles, laser_rate in itertools.product(
+            args.players, args.projectiles, args.laser_rates
+        ):
+            results.append(bench(players, projectiles, laser_rate, args))
+        run = {
+            "version": BASELINE_VERSION,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "settings": {
+                "enemies": args.enemies,
+                "ticks": args.ticks,
+                "warmup": args.warmup,
+                "alloc_ticks": args.alloc_ticks,
+                "protocol": args.protocol,
+                "seed": args.seed,
+                "tick_rate": TICK_RATE,
+                "snapshot_rate": SNAPSHOT_RATE,
+            },
+            "results": results,
+        }
+    print_results(run["results"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != run["settings"]:
+            print("Warning: the baseline was recorded with different settings")
+        print()
+        regressions = compare(run["results"], baseline, args.threshold)
+        print(f"Regressions: {regressions}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from client import GameClient, PlayerState
+from movement import INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, apply_input
+from transport import EndPointGroup
+
+FRAME_RATE = 60
+PLAYER_SIZE = 100
+ENEMY_SIZE = 100
+PROJECTILE_SPEED = 400
+
+# Seconds between round trip probes
+PING_INTERVAL = 1.0
+
+# Wandering bots turn about once a second and head back once they are this
+# far from the origin, where the enemies spawn
+TURN_RATE = 1
+WANDER_RADIUS = 800
+KEYS = [
+    0,
+    INPUT_UP,
+    INPUT_DOWN,
+    INPUT_LEFT,
+    INPUT_RIGHT,
+    INPUT_UP | INPUT_LEFT,
+    INPUT_UP | INPUT_RIGHT,
+    INPUT_DOWN | INPUT_LEFT,
+    INPUT_DOWN | INPUT_RIGHT,
+]
+
+# What each kind of bot does. Chasing bots walk towards the nearest enemy and
+# aim at it; the rates are per second.
+PROFILES = {
+    "wander": {"chase": False, "fire_rate": 0, "laser_rate": 0, "chat_rate": 0},
+    "chase": {"chase": True, "fire_rate": 2, "laser_rate": 0.2, "chat_rate": 0},
+    "spam": {"chase": False, "fire_rate": 20, "laser_rate": 2, "chat_rate": 0},
+    "chat": {"chase": False, "fire_rate": 0, "laser_rate": 0, "chat_rate": 2},
+}
+
+
+class Bot(GameClient):
+    # A headless client on the real protocol, playing by one of the PROFILES
+    # and recording round trip times and snapshot arrival times
+    def __init__(self, connection, name, profile, rng):
+        GameClient.__init__(self, connection, PlayerState(name))
+        self.profile_name = profile
+        self.profile = PROFILES[profile]
+        self.rng = rng
+        self.keys = 0
+        self.game_state = None
+        self.disconnected = False
+        self.errors = 0
+        self.ping_seq = 0
+        self.pings = {}
+        self.last_ping = 0
+        self.rtts = []
+        self.arrivals = []
+        self.sent = {"projectile": 0, "laser_beam": 0, "chat": 0}
+
+    def Network_pong(self, data):
+        sent = self.pings.pop(data["id"], None)
+        if sent is not None:
+            self.rtts.append(time.monotonic() - sent)
+
+    def Network_error(self, data):
+        self.errors += 1
+
+    def Network_disconnected(self, data):
+        self.disconnected = True
+
+    def sync(self, game_state):
+        self.game_state = game_state
+        self.arrivals.append(time.monotonic())
+
+    def target(self):
+        # Centre of the nearest enemy in the last snapshot
+        if not self.game_state or not self.game_state["enemies"]:
+            return None
+        x = self.player.x + PLAYER_SIZE / 2
+        y = self.player.y + PLAYER_SIZE / 2
+        enemy = min(
+            self.game_state["enemies"].values(),
+            key=lambda e: (e["x"] - x) ** 2 + (e["y"] - y) ** 2,
+        )
+        return enemy["x"] + ENEMY_SIZE / 2, enemy["y"] + ENEMY_SIZE / 2
+
+    def steer(self, dt):
+        target = self.target() if self.profile["chase"] else None
+        if target is not None:
+            keys = 0
+            dx = target[0] - self.player.x - PLAYER_SIZE / 2
+            dy = target[1] - self.player.y - PLAYER_SIZE / 2
+            if dx > PLAYER_SIZE:
+                keys |= INPUT_RIGHT
+            elif dx < -PLAYER_SIZE:
+                keys |= INPUT_LEFT
+            if dy > PLAYER_SIZE:
+                keys |= INPUT_DOWN
+            elif dy < -PLAYER_SIZE:
+                keys |= INPUT_UP
+            return keys
+
+        keys = 0
+        if self.player.x < -WANDER_RADIUS:
+            keys |= INPUT_RIGHT
+        elif self.player.x > WANDER_RADIUS:
+            keys |= INPUT_LEFT
+        if self.player.y < -WANDER_RADIUS:
+            keys |= INPUT_DOWN
+        elif self.player.y > WANDER_RADIUS:
+            keys |= INPUT_UP
+        if keys:
+            self.keys = keys
+        elif self.rng.random() < TURN_RATE * dt:
+            self.keys = self.rng.choice(KEYS)
+        return self.keys
+
+    def aim(self):
+        target = self.target()
+        if target is None:
+            return self.rng.uniform(0, 2 * math.pi)
+        return math.atan2(
+            target[1] - self.player.y - PLAYER_SIZE / 2,
+            target[0] - self.player.x - PLAYER_SIZE / 2,
+        )
+
+    def send(self, data):
+        self.sent[data["action"]] += 1
+        self.connection.Send(data)
+
+    def update(self, ms):
+        if self.player_id is None or self.disconnected:
+            return
+        dt = ms / 1000
+        keys = self.steer(dt)
+        self.player.x, self.player.y = apply_input(
+            self.player.x, self.player.y, keys, self.player.speed, dt
+        )
+        self.input_sender.update(ms, keys)
+        self.smooth_correction(dt)
+
+        now = time.monotonic()
+        if now - self.last_ping > PING_INTERVAL:
+            self.ping_seq += 1
+            self.pings[self.ping_seq] = now
+            self.connection.Send({"action": "ping", "id": self.ping_seq})
+            self.last_ping = now
+
+        x = self.player.x + PLAYER_SIZE // 2
+        y = self.player.y + PLAYER_SIZE // 2
+        if self.rng.random() < self.profile["fire_rate"] * dt:
+            angle = self.aim()
+            self.send(
+                {
+                    "action": "projectile",
+                    "x": x,
+                    "y": y,
+                    "velocity": [
+                        math.cos(angle) * PROJECTILE_SPEED,
+                        math.sin(angle) * PROJECTILE_SPEED,
+                    ],
+                    "name": self.player.name,
+                }
+            )
+        if self.rng.random() < self.profile["laser_rate"] * dt:
+            self.send(
+                {
+                    "action": "laser_beam",
+                    "x": x,
+                    "y": y,
+                    "angle": self.aim(),
+                    "name": self.player.name,
+                }
+            )
+        if self.rng.random() < self.profile["chat_rate"] * dt:
+            self.send(
+                {
+                    "action": "chat",
+                    "message": f"{self.player.name} says hi #{self.sent['chat']}",
+                }
+            )
+
+    def stats(self):
+        # (RTT p50, RTT p95, mean snapshot interval, interval jitter) in ms;
+        # the jitter is the standard deviation of the intervals
+        rtt = np.percentile(self.rtts, (50, 95)) * 1000 if self.rtts else (0, 0)
+        intervals = np.diff(self.arrivals) * 1000
+        if len(intervals) == 0:
+            return tuple(rtt) + (0, 0)
+        return tuple(rtt) + (intervals.mean(), intervals.std())
+
+
+def report(bots, frames, elapsed):
+    print(
+        f"{'bot':<10} {'profile':<8} {'snapshots':>9} {'rtt p50':>8} "
+        f"{'rtt p95':>8} {'interval':>8} {'jitter':>7} {'corrections':>11}"
+    )
+    for bot in bots:
+        rtt_p50, rtt_p95, interval, jitter = bot.stats()
+        status = " disconnected" if bot.disconnected else ""
+        print(
+            f"{bot.player.name:<10} {bot.profile_name:<8} {len(bot.arrivals):>9} "
+            f"{rtt_p50:>8.1f} {rtt_p95:>8.1f} {interval:>8.1f} {jitter:>7.1f} "
+            f"{bot.corrections:>11}{status}"
+        )
+
+    rtts = [rtt for bot in bots for rtt in bot.rtts]
+    jitters = [bot.stats()[3] for bot in bots if len(bot.arrivals) > 1]
+    print(
+        f"Bots: {len(bots)}, connected: {sum(bot.player_id is not None for bot in bots)}, "
+        f"disconnected: {sum(bot.disconnected for bot in bots)}, "
+        f"errors: {sum(bot.errors for bot in bots)}"
+    )
+    if rtts:
+        p50, p95, p99 = np.percentile(rtts, (50, 95, 99)) * 1000
+        print(f"RTT: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+    if jitters:
+        print(
+            f"Snapshot jitter: mean {np.mean(jitters):.1f} ms, "
+            f"worst {max(jitters):.1f} ms"
+        )
+    for action in ("projectile", "laser_beam", "chat"):
+        print(f"Sent {action}: {sum(bot.sent[action] for bot in bots)}")
+    # Falling short of --frame-rate means the bots, not the server, are the
+    # bottleneck and the numbers above are suspect
+    print(f"Frames: {frames}, {frames / elapsed:.1f} per second")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test a server with headless bots speaking the real protocol"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=sorted(PROFILES),
+        default=["wander"],
+        help="behaviours handed out to the bots in turn",
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument(
+        "--ramp", type=float, default=0, help="seconds to spread the connects over"
+    )
+    parser.add_argument("--frame-rate", type=float, default=FRAME_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    group = EndPointGroup(args.transport)
+    bots = []
+    frame = 1 / args.frame_rate
+    frames = 0
+    start = last = time.monotonic()
+    try:
+        while time.monotonic() - start < args.duration:
+            elapsed = time.monotonic() - start
+            while len(bots) < args.bots and (
+                not args.ramp or len(bots) * args.ramp / args.bots <= elapsed
+            ):
+                i = len(bots)
+                bot = Bot(
+                    group.endpoint(),
+                    f"bot{i}",
+                    args.profiles[i % len(args.profiles)],
+                    random.Random(rng.random()),
+                )
+                bots.append(bot)
+                bot.Connect((args.host, args.port))
+
+            # Whole milliseconds, as the game client sends them
+            ms = int((time.monotonic() - last) * 1000)
+            last += ms / 1000
+            for bot in bots:
+                bot.Pump()
+                bot.update(ms)
+            group.Pump()
+            frames += 1
+            time.sleep(max(0, frame - (time.monotonic() - last)))
+    except KeyboardInterrupt:
+        pass
+    report(bots, frames, time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    main()
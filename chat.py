@@ -0,0 +1,72 @@
+import time
+from collections import deque
+
+# Each sender may post CHAT_BURST messages at once, refilled at CHAT_RATE per
+# second; anything over that is dropped instead of fanned out to every player
+CHAT_RATE = 1
+CHAT_BURST = 5
+CHAT_HISTORY = 50
+MAX_MESSAGE_LENGTH = 200
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = now
+
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ChatService:
+    # Accepted messages are kept in a bounded history for late joiners and
+    # queued until the server flushes them to everyone in one batch per tick.
+    def __init__(
+        self,
+        history=CHAT_HISTORY,
+        rate=CHAT_RATE,
+        burst=CHAT_BURST,
+        clock=time.monotonic,
+    ):
+        self.history = deque(maxlen=history)
+        self.pending = []
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets = {}
+        self.accepted = 0
+        self.dropped = 0
+
+    def post(self, channel, sender, message):
+        now = self.clock()
+        bucket = self.buckets.get(channel)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, now)
+            self.buckets[channel] = bucket
+        if not bucket.take(now):
+            self.dropped += 1
+            return False
+
+        entry = (sender, message[:MAX_MESSAGE_LENGTH])
+        self.history.append(entry)
+        self.pending.append(entry)
+        self.accepted += 1
+        return True
+
+    def flush(self):
+        pending = self.pending
+        self.pending = []
+        return pending
+
+    def backlog(self):
+        return list(self.history)
+
+    def remove(self, channel):
+        self.buckets.pop(channel, None)
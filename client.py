@@ -0,0 +1,172 @@
+import math
+import time
+
+from interpolation import SnapshotBuffer
+from movement import apply_input
+from protocol import PROTOCOL_VERSION
+from snapshot import apply_delta
+
+# Most move messages sent per second; nothing is sent while standing still
+INPUT_RATE = 30
+
+# Prediction errors are blended out at this rate per second, unless they are
+# too large to hide, and errors below the epsilon are rounding noise
+CORRECTION_RATE = 10
+CORRECTION_SNAP_DISTANCE = 200
+CORRECTION_EPSILON = 0.5
+
+PLAYER_SPEED = 300
+
+
+class InputSender:
+    # Batches the keys held by the local player into sequence-numbered inputs
+    # and keeps the ones the server has not processed yet, for replaying on top
+    # of the server's position. Durations are whole milliseconds so the server
+    # moves by exactly what the client predicted.
+    def __init__(self, connection, rate=INPUT_RATE):
+        self.connection = connection
+        self.interval = 1000 // rate
+        self.seq = 0
+        self.keys = 0
+        self.held = 0
+        self.pending = []
+
+    def update(self, ms, keys):
+        if keys != self.keys:
+            self.flush()
+            self.keys = keys
+        if keys:
+            self.held += ms
+            if self.held >= self.interval:
+                self.flush()
+
+    def flush(self):
+        if self.keys and self.held:
+            self.seq += 1
+            self.pending.append((self.seq, self.keys, self.held))
+            self.connection.Send(
+                {"action": "move", "seq": self.seq, "keys": self.keys, "dt": self.held}
+            )
+        self.held = 0
+
+    def acknowledge(self, seq):
+        self.pending = [pending for pending in self.pending if pending[0] > seq]
+
+    def replay(self, x, y, speed):
+        for _, keys, ms in self.pending:
+            x, y = apply_input(x, y, keys, speed, ms / 1000)
+        # Movement since the last flush has been predicted but not sent yet
+        return apply_input(x, y, self.keys, speed, self.held / 1000)
+
+
+class PlayerState:
+    # The local player as far as the protocol is concerned, for clients that
+    # do not draw it
+    def __init__(self, name, speed=PLAYER_SPEED):
+        self.x = 0
+        self.y = 0
+        self.speed = speed
+        self.name = name
+        self.health = 100
+
+
+class GameClient:
+    # Everything a client does on the wire, without rendering: the handshake,
+    # delta snapshots and their acks, prediction and reconciliation of the
+    # local player, and chat. Subclasses react to each new snapshot in sync()
+    # and to chat from other players in chat_message().
+    def __init__(self, connection, player):
+        self.connection = connection
+        self.player = player
+        self.player_id = None
+        self.input_sender = InputSender(connection)
+        self.correction = [0, 0]
+        self.corrections = 0
+        self.last_correction = 0
+        self.max_correction = 0
+        self.snapshots = dict()
+        self.snapshot_buffer = SnapshotBuffer()
+
+    def Pump(self):
+        for data in self.connection.GetQueue():
+            for n in ("Network_" + data["action"], "Network"):
+                if hasattr(self, n):
+                    getattr(self, n)(data)
+
+    def Connect(self, address):
+        self.connection.DoConnect(address)
+        self.Pump()
+        self.input_sender = InputSender(self.connection)
+        self.connection.Send(
+            {"action": "hello", "protocol": PROTOCOL_VERSION, "name": self.player.name}
+        )
+
+    def Network_hello(self, data):
+        self.connection.protocol = data["protocol"]
+        self.player_id = data["id"]
+
+    def Network_game_state(self, data):
+        delta = data["data"]
+        game_state = apply_delta(
+            self.snapshots.get(delta["base"], {}),
+            delta["changed"],
+            delta["removed"],
+            ("players", "enemies", "projectiles", "laser_beams"),
+        )
+
+        # The server never diffs against anything older than the base it just used
+        if delta["base"] is not None:
+            self.snapshots = {
+                seq: snapshot
+                for seq, snapshot in self.snapshots.items()
+                if seq >= delta["base"]
+            }
+        self.snapshots[delta["seq"]] = game_state
+        self.snapshot_buffer.add(time.monotonic(), delta["time"] / 1000, game_state)
+        self.connection.Send({"action": "ack", "seq": delta["seq"]})
+
+        own = game_state["players"].get(self.player_id)
+        if own is not None:
+            self.player.health = own["health"]
+            self.reconcile(own)
+        self.sync(game_state)
+
+    def sync(self, game_state):
+        pass
+
+    def reconcile(self, record):
+        # Rewind to the server's position and replay the inputs it has not
+        # processed yet; the difference to the predicted position is an error
+        self.input_sender.acknowledge(record["input_seq"])
+        x, y = self.input_sender.replay(record["x"], record["y"], self.player.speed)
+        error_x = x - self.player.x
+        error_y = y - self.player.y
+        magnitude = math.hypot(error_x, error_y)
+
+        if magnitude > CORRECTION_EPSILON:
+            self.corrections += 1
+            self.last_correction = magnitude
+            self.max_correction = max(self.max_correction, magnitude)
+
+        if magnitude > CORRECTION_SNAP_DISTANCE:
+            self.player.x = x
+            self.player.y = y
+            self.correction = [0, 0]
+        else:
+            self.correction = [error_x, error_y]
+
+    def smooth_correction(self, dt):
+        blend = min(1, CORRECTION_RATE * dt)
+        step_x = self.correction[0] * blend
+        step_y = self.correction[1] * blend
+        self.player.x += step_x
+        self.player.y += step_y
+        self.correction = [self.correction[0] - step_x, self.correction[1] - step_y]
+
+    def Network_chat(self, data):
+        for sender, message in data["messages"]:
+            if sender != self.player.name:
+                self.chat_message(sender, message)
+
+    def chat_message(self, sender, message):
+        pass
@@ -0,0 +1,120 @@
+import numpy as np
+
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+
+HIT_FLASH_FRAMES = 30
+RESPAWN_RANGE = 1000
+
+# Bounds the enemies x players distance matrix built per nearest-player chunk
+NEAREST_CHUNK = 4096
+
+
+class EnemyManager:
+    # Structure-of-arrays store for every enemy on the map, laid out like
+    # ProjectilePool: live enemies occupy the first `count` slots.
+    def __init__(self, size, speed, minimap_radius, capacity=64, health=100):
+        self.size = size
+        self.speed = speed
+        self.minimap_radius = minimap_radius
+        self.max_health = health
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.positions = np.zeros((capacity, 2))
+        self.health = np.zeros(capacity, dtype=np.int64)
+        self.hit_timers = np.zeros(capacity, dtype=np.int64)
+        self.rng = np.random.default_rng()
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        capacity = len(self.ids) * 2
+        for name in ("ids", "positions", "health", "hit_timers"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def spawn(self, entity_id, x, y, health=None, hit_timer=0):
+        if self.count == len(self.ids):
+            self.grow()
+        i = self.count
+        self.ids[i] = entity_id
+        self.positions[i] = (x, y)
+        self.health[i] = self.max_health if health is None else health
+        self.hit_timers[i] = hit_timer
+        self.count += 1
+
+    def remove(self, indices):
+        # Live enemies stay packed at the front, in their original order
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        n = int(keep.sum())
+        for name in ("ids", "positions", "health", "hit_timers"):
+            array = getattr(self, name)
+            array[:n] = array[: self.count][keep]
+        self.count = n
+
+    def nearest(self, targets):
+        # Index into targets of the closest target for every enemy
+        n = self.count
+        nearest = np.empty(n, dtype=np.int64)
+        for start in range(0, n, NEAREST_CHUNK):
+            chunk = self.positions[start : min(n, start + NEAREST_CHUNK)]
+            offsets = chunk[:, None, :] - targets[None, :, :]
+            distances = np.einsum("ijk,ijk->ij", offsets, offsets)
+            nearest[start : start + len(chunk)] = distances.argmin(axis=1)
+        return nearest
+
+    def move(self, dt, targets):
+        # Step each axis toward the target at full speed, like Enemy.move did
+        n = self.count
+        self.positions[:n] += np.sign(targets - self.positions[:n]) * self.speed * dt
+
+    def fire(self, targets, probability, speed):
+        # Returns (enemy indices, origins, velocities) for the enemies that shoot
+        n = self.count
+        shooters = np.flatnonzero(self.rng.random(n) < probability)
+        offsets = targets[shooters] - self.positions[shooters]
+        angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+        velocities = np.column_stack((np.cos(angles), np.sin(angles))) * speed
+        origins = self.positions[shooters] + self.size // 2
+        return shooters, origins, velocities
+
+    def hittable(self):
+        # Enemies flash red for a while after a hit and ignore projectiles
+        return self.hit_timers[: self.count] == 0
+
+    def hit(self, indices, damage):
+        np.subtract.at(self.health, indices, damage)
+        self.hit_timers[indices] = HIT_FLASH_FRAMES
+
+    def dead(self):
+        return np.flatnonzero(self.health[: self.count] <= 0)
+
+    def respawn(self, indices, player_pos):
+        # Random spot within RESPAWN_RANGE of player_pos, outside the minimap
+        pending = np.asarray(indices)
+        while len(pending):
+            offsets = self.rng.integers(
+                -RESPAWN_RANGE, RESPAWN_RANGE, size=(len(pending), 2), endpoint=True
+            )
+            self.positions[pending] = np.asarray(player_pos) + offsets
+            pending = pending[(np.abs(offsets) <= self.minimap_radius).all(axis=1)]
+
+        self.health[indices] = self.max_health
+        self.hit_timers[indices] = 0
+
+    def update(self):
+        timers = self.hit_timers[: self.count]
+        timers[timers > 0] -= 1
+
+    def records(self):
+        n = self.count
+        return zip(
+            self.ids[:n].tolist(),
+            self.positions[:n].tolist(),
+            self.hit_timers[:n].tolist(),
+            self.health[:n].tolist(),
+        )
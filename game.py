@@ -1,9 +1,16 @@
 import pygame
-import random
 import math
-from PodSixNet.Connection import ConnectionListener, connection
+import time
+from collections import deque
+from client import GameClient
+from atlas import atlas
+from background import Background
+from text_cache import text_cache
+from movement import INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, apply_input
+from transport import TcpEndPoint, UdpEndPoint
 
 DEBUG_MODE = True
+TRANSPORT = "tcp"  # or "udp", matching the server's --transport
 BORDERLESS_FULLSCREEN = False
 WINDOWED = True
 
@@ -26,6 +33,9 @@ if WINDOWED:
     screen = pygame.display.set_mode((width, height), pygame.SHOWN)
     pygame.display.set_caption("Untitled Game")
 
+# The one connection to the server, used by Game and the chat box
+connection = UdpEndPoint() if TRANSPORT == "udp" else TcpEndPoint()
+
 
 # Define colors
 RED = (255, 0, 0)
@@ -47,46 +57,40 @@ LASER_FADE_DURATION = 0.5
 PROJECTILE_DAMAGE = 10
 LASER_DAMAGE = 30
 
+# Chat messages and wrapped chat lines kept for scrollback
+CHAT_HISTORY = 100
+CHAT_HISTORY_LINES = 200
+
 
 class GameObject:
-    def __init__(self, x, y, size, color, speed, sprite_path=None, frame_images=None):
+    def __init__(self, x, y, size, color, speed, animation=None):
         self.x = x
         self.y = y
         self.size = size
         self.color = color
         self.speed = speed
-        self.sprite_path = sprite_path
-        self.frame_images = frame_images
-        self.animation_frames = []
+        self.id = None
+        self.animation = None
         self.current_frame = 0
         self.animation_speed = 0.2
         self.elapsed_time = 0
 
-        if self.sprite_path:
-            self.sprite = pygame.image.load(sprite_path).convert_alpha()
-            self.sprite = pygame.transform.smoothscale(self.sprite, (size, size))
-        elif self.frame_images:
-            for frame_image in self.frame_images:
-                loaded_image = pygame.image.load(frame_image).convert_alpha()
-                scaled_image = pygame.transform.smoothscale(loaded_image, (size, size))
-                self.animation_frames.append(scaled_image)
+        if animation:
+            self.animation = atlas.get(animation, (size, size))
 
     def draw(self, screen, offset_x, offset_y):
-        if self.sprite_path:
-            screen.blit(self.sprite, (int(self.x - offset_x), int(self.y - offset_y)))
-        elif self.frame_images:
-            current_frame_image = self.animation_frames[self.current_frame]
-            screen.blit(
-                current_frame_image, (int(self.x - offset_x), int(self.y - offset_y))
+        if self.animation:
+            self.animation.draw(
+                screen,
+                self.current_frame,
+                (int(self.x - offset_x), int(self.y - offset_y)),
             )
 
     def update(self, dt):
-        if self.frame_images:
+        if self.animation:
             self.elapsed_time += dt
             if self.elapsed_time >= self.animation_speed:
-                self.current_frame = (self.current_frame + 1) % len(
-                    self.animation_frames
-                )
+                self.current_frame = (self.current_frame + 1) % len(self.animation)
                 self.elapsed_time = 0
 
     def draw_health_bar(self, screen, offset_x, offset_y):
@@ -121,21 +125,21 @@ class Player(GameObject):
             size,
             color,
             speed,
-            frame_images=[
-                "resources/player1.png",
-                "resources/player2.png",
-                "resources/player3.png",
-                "resources/player2.png",
-            ],
+            animation="player",
         )
         self.name = str(name) if name else ""
+        self.name_tag = None
+        self.name_tag_text = None
         self.has_laser_beam = False
         self.money = money
         self.health = 100
 
     def draw(self, screen, offset_x, offset_y):
         super().draw(screen, offset_x, offset_y)
-        name_text = font.render(self.name, True, BLACK)
+        if self.name_tag_text != self.name:
+            self.name_tag = font.render(self.name, True, BLACK)
+            self.name_tag_text = self.name
+        name_text = self.name_tag
         name_rect = name_text.get_rect(
             center=(
                 int(self.x - offset_x + self.size // 2),
@@ -144,21 +148,19 @@ class Player(GameObject):
         )
         screen.blit(name_text, name_rect)
 
-    def move(self, dt, keys, entity, game):
-        if game.chat_active:
-            return
-
+    def move(self, dt, keys):
+        # Returns the input applied, for InputSender to send to the server
+        input_keys = 0
         if keys[pygame.K_w]:
-            self.y -= self.speed * dt
+            input_keys |= INPUT_UP
         if keys[pygame.K_s]:
-            self.y += self.speed * dt
+            input_keys |= INPUT_DOWN
         if keys[pygame.K_a]:
-            self.x -= self.speed * dt
+            input_keys |= INPUT_LEFT
         if keys[pygame.K_d]:
-            self.x += self.speed * dt
-        connection.Send(
-            {"action": "move", "x": entity.x, "y": entity.y, "name": self.name}
-        )
+            input_keys |= INPUT_RIGHT
+        self.x, self.y = apply_input(self.x, self.y, input_keys, self.speed, dt)
+        return input_keys
 
 
 class Enemy(GameObject):
@@ -169,57 +171,18 @@ class Enemy(GameObject):
             size,
             color,
             speed,
-            frame_images=["resources/enemy1.png"],
+            animation="enemy",
         )
         self.hit_count = 0
         self.hit_timer = 0
         self.minimap_radius = minimap_radius
         self.health = 100
 
-    def move(self, dt, player_pos):
-        if self.x < player_pos[0]:
-            self.x += self.speed * dt
-        if self.x > player_pos[0]:
-            self.x -= self.speed * dt
-        if self.y < player_pos[1]:
-            self.y += self.speed * dt
-        if self.y > player_pos[1]:
-            self.y -= self.speed * dt
-        # connection.Send({"action": "move", "x": self.player.x, "y": self.player.y})
-
     def hit(self):
         self.hit_count += 1
         self.hit_timer = 30  # Set the timer for 30 frames (0.5 seconds at 60 FPS)
         self.color = RED
 
-    def respawn(self, player_pos):
-        if DEBUG_MODE:
-            return
-
-        # Calculate the bounds of the minimap
-        minimap_left = player_pos[0] - self.minimap_radius
-        minimap_right = player_pos[0] + self.minimap_radius
-        minimap_top = player_pos[1] - self.minimap_radius
-        minimap_bottom = player_pos[1] + self.minimap_radius
-
-        # Generate random coordinates outside the minimap bounds
-        while True:
-            self.x = player_pos[0] + random.randint(-1000, 1000)
-            self.y = player_pos[1] + random.randint(-1000, 1000)
-
-            # Check if the enemy is outside the minimap bounds
-            if (
-                self.x < minimap_left
-                or self.x > minimap_right
-                or self.y < minimap_top
-                or self.y > minimap_bottom
-            ):
-                break
-
-        self.color = GREEN
-        self.hit_count = 0
-        self.hit_timer = 0
-
     def update(self, dt):
         super().update(dt)
         if self.hit_timer > 0:
@@ -237,16 +200,18 @@ class ShopScreen:
 
     def draw(self, screen):
         screen.fill(WHITE)
-        title_text = self.font.render("Shop", True, BLACK)
+        title_text = text_cache.render(self.font, "Shop", True, BLACK)
         title_rect = title_text.get_rect(center=(width // 2, height // 4))
         screen.blit(title_text, title_rect)
 
-        laser_beam_text = self.font.render("Laser Beam - $500", True, BLACK)
+        laser_beam_text = text_cache.render(self.font, "Laser Beam - $500", True, BLACK)
         laser_beam_rect = laser_beam_text.get_rect(center=(width // 2, height // 2))
         screen.blit(laser_beam_text, laser_beam_rect)
 
         if self.laser_beam_purchased:
-            purchased_text = self.font.render("Laser Beam purchased!", True, GREEN)
+            purchased_text = text_cache.render(
+                self.font, "Laser Beam purchased!", True, GREEN
+            )
             purchased_rect = purchased_text.get_rect(
                 center=(width // 2, height // 2 + 50)
             )
@@ -292,7 +257,7 @@ class Minimap:
         self.color = color
         self.scale = scale
 
-    def draw(self, screen, player, enemy):
+    def draw(self, screen, player, enemies):
         pygame.draw.rect(
             screen,
             self.color,
@@ -309,21 +274,22 @@ class Minimap:
         center_x = self.position[0] + self.width // 2
         center_y = self.position[1] + self.height // 2
 
-        # Calculate the relative positions of the player and enemy
+        # Calculate the relative position of the player
         player_x = center_x + (player.x - player.x) // self.scale
         player_y = center_y + (player.y - player.y) // self.scale
-        enemy_x = center_x + (enemy.x - player.x) // self.scale
-        enemy_y = center_y + (enemy.y - player.y) // self.scale
 
-        # Check if the enemy is within the minimap boundaries
-        if (
-            self.position[0] <= enemy_x <= self.position[0] + self.width
-            and self.position[1] <= enemy_y <= self.position[1] + self.height
-        ):
+        for enemy in enemies:
+            enemy_x = center_x + (enemy.x - player.x) // self.scale
+            enemy_y = center_y + (enemy.y - player.y) // self.scale
+
             # Draw the enemy on the minimap only if it's within the boundaries
-            pygame.draw.circle(
-                screen, enemy.color, (enemy_x, enemy_y), enemy.size // self.scale
-            )
+            if (
+                self.position[0] <= enemy_x <= self.position[0] + self.width
+                and self.position[1] <= enemy_y <= self.position[1] + self.height
+            ):
+                pygame.draw.circle(
+                    screen, enemy.color, (enemy_x, enemy_y), enemy.size // self.scale
+                )
 
         # Draw the player at the center of the minimap
         pygame.draw.circle(
@@ -336,6 +302,11 @@ class Projectile(GameObject):
         super().__init__(x, y, size, color, speed)
         self.velocity = velocity
 
+    def reset(self, x, y, velocity):
+        self.x = x
+        self.y = y
+        self.velocity = velocity
+
     def move(self, dt):
         self.x += self.velocity[0] * dt
         self.y += self.velocity[1] * dt
@@ -349,6 +320,27 @@ class Projectile(GameObject):
         )
 
 
+class ObjectPool:
+    # Free list of entities the server stopped sending, handed out again with
+    # reset() instead of being rebuilt. allocations counts the misses.
+    def __init__(self, factory):
+        self.factory = factory
+        self.free = []
+        self.allocations = 0
+
+    def acquire(self, *args):
+        if self.free:
+            entity = self.free.pop()
+            entity.reset(*args)
+            return entity
+        self.allocations += 1
+        return self.factory(*args)
+
+    def release(self, entity):
+        entity.id = None
+        self.free.append(entity)
+
+
 class Money:
     def __init__(self):
         self.amount = 0
@@ -360,8 +352,13 @@ class Money:
 class LaserBeam(GameObject):
     def __init__(self, x, y, size, color, speed, angle, fade_duration):
         super().__init__(x, y, size, color, speed)
-        self.angle = angle
         self.fade_duration = fade_duration * 1000
+        self.reset(x, y, angle)
+
+    def reset(self, x, y, angle):
+        self.x = x
+        self.y = y
+        self.angle = angle
         self.fade_timer = 0
         self.spawn_time = pygame.time.get_ticks()
         self.start_point = (x, y)
@@ -419,47 +416,64 @@ class ChatBox:
         self.bg_color = bg_color
         self.text_color = text_color
         self.input_text = ""
-        self.chat_log = []
+        self.chat_log = deque(maxlen=CHAT_HISTORY)
+        # Wrapped and rendered once, when the message arrives
+        self.lines = deque(maxlen=CHAT_HISTORY_LINES)
+        self.bg_surface = None
+        self.truncated_text = ""
+        self.truncated_start = 0
         self.active = False
         self.typing_indicator = ""
         self.typing_indicator_visible = True
         self.typing_indicator_timer = 0
         self.typing_indicator_interval = 500
 
+    def add_message(self, message):
+        self.chat_log.append(message)
+        for line in self.wrap(message, self.width - 20):
+            self.lines.append(self.font.render(line, True, self.text_color))
+
+    def fit(self, text, width):
+        # Length of the longest prefix of text that fits in width, at least one
+        # character so that every line makes progress
+        low, high = 1, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.font.size(text[:middle])[0] <= width:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def wrap(self, message, width):
+        lines = []
+        while message:
+            length = self.fit(message, width)
+            lines.append(message[:length])
+            message = message[length:]
+        return lines
+
     def draw(self, screen):
         # Draw semi-transparent background
-        bg_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        bg_surface.fill(self.bg_color)
-        screen.blit(bg_surface, (self.x, self.y))
+        if self.bg_surface is None or self.bg_surface.get_height() != self.height:
+            self.bg_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+            self.bg_surface.fill(self.bg_color)
+        screen.blit(self.bg_surface, (self.x, self.y))
 
         input_height = self.font.get_height() + 10
         available_height = self.height - input_height - 20
         max_lines = available_height // self.font.get_height()
-        lines = []
-        for message in self.chat_log:
-            line = ""
-            for char in message:
-                test_line = line + char
-                if self.font.size(test_line)[0] <= self.width - 20:
-                    line = test_line
-                else:
-                    lines.append(line)
-                    line = char
-            if line:
-                lines.append(line)
 
-        # Get the last max_lines lines from the chat log
-        recent_lines = lines[-max_lines:]
+        # Draw the last max_lines lines from the chat log
         y = self.y + self.height - input_height - 20
-        for line in reversed(recent_lines):
-            text_surface = self.font.render(line, True, self.text_color)
-            screen.blit(text_surface, (self.x + 10, y))
+        for i in range(min(max_lines, len(self.lines))):
+            screen.blit(self.lines[-1 - i], (self.x + 10, y))
             y -= self.font.get_height()
 
         # Draw input bar
         input_width = self.width - 20
         truncated_input_text = self.truncate_input_text(self.input_text, input_width)
-        input_surface = self.font.render(truncated_input_text, True, BLACK)
+        input_surface = text_cache.render(self.font, truncated_input_text, True, BLACK)
         input_height = self.font.get_height() + 10
         input_bg_color = GRAY if self.active else WHITE
         pygame.draw.rect(
@@ -490,30 +504,39 @@ class ChatBox:
         if self.active and self.typing_indicator_visible:
             typing_indicator_x = self.x + 10 + input_surface.get_width()
             typing_indicator_y = self.y + self.height - 25
-            typing_indicator_surface = self.font.render(
-                self.typing_indicator, True, BLACK
+            typing_indicator_surface = text_cache.render(
+                self.font, self.typing_indicator, True, BLACK
             )
             screen.blit(
                 typing_indicator_surface, (typing_indicator_x, typing_indicator_y)
             )
 
     def truncate_input_text(self, text, width):
-        truncated_text = ""
-        for char in reversed(text):
-            test_text = truncated_text
-            test_text = char + test_text
-            if self.font.size(test_text)[0] <= width:
-                truncated_text = test_text
+        # Longest suffix of text that fits in width. Typing only appends, which
+        # can only move the start of the suffix forward, so the search resumes
+        # from the previous start.
+        if text == self.truncated_text:
+            return text[self.truncated_start :]
+        low = 0
+        if text.startswith(self.truncated_text):
+            low = self.truncated_start
+        high = len(text)
+        while low < high:
+            middle = (low + high) // 2
+            if self.font.size(text[middle:])[0] <= width:
+                high = middle
             else:
-                break
-        return truncated_text
+                low = middle + 1
+        self.truncated_text = text
+        self.truncated_start = low
+        return text[low:]
 
     def update(self, event, player, game):
         if event.type == pygame.KEYDOWN:
             if self.active:
                 if event.key == pygame.K_RETURN:
                     if self.input_text:
-                        self.chat_log.append(f"{player.name}: {self.input_text}")
+                        self.add_message(f"{player.name}: {self.input_text}")
                         connection.Send(
                             {
                                 "action": "chat",
@@ -550,22 +573,35 @@ class ChatBox:
                 self.y = height - self.inactive_height - 10
 
 
-class Game(ConnectionListener):
-
+class Game(GameClient):
     def __init__(self):
+        atlas.preload(["player"], (PLAYER_SIZE, PLAYER_SIZE))
+        atlas.preload(["enemy"], (ENEMY_SIZE, ENEMY_SIZE))
         self.money = Money()
-        self.player = Player(
-            0, 0, PLAYER_SIZE, RED, 300, "Player", self.money
+        GameClient.__init__(
+            self,
+            connection,
+            Player(0, 0, PLAYER_SIZE, RED, 300, "Player", self.money),
         )  # Initialize the player with a default name
         self.players = dict()
-        self.enemy = None
-        self.projectiles = []
+        self.enemies = dict()
+        self.projectiles = dict()
         self.own_projectiles = []
-        self.laser_beams = []
+        self.laser_beams = dict()
+        self.own_laser_beams = []
+        self.projectile_pool = ObjectPool(
+            lambda x, y, velocity: Projectile(x, y, 5, RED, 400, velocity)
+        )
+        self.laser_beam_pool = ObjectPool(
+            lambda x, y, angle: LaserBeam(
+                x, y, LASER_BEAM_SIZE, RED, 0, angle, LASER_FADE_DURATION
+            )
+        )
         self.font = pygame.font.Font(None, 36)
         self.running = False
         self.offset_x = 0
         self.offset_y = 0
+        self.background = Background(WHITE, GRAY)
         self.player_name = ""
         self.ip_address = ""
         minimap_width = 200
@@ -575,6 +611,7 @@ class Game(ConnectionListener):
         self.minimap = Minimap(
             minimap_width, minimap_height, (minimap_x, minimap_y), WHITE, 10
         )
+        self.minimap_radius = min(minimap_width, minimap_height) // 2
         self.shop_screen = ShopScreen(self.player)
         self.connected = False
         self.chat_font = pygame.font.Font(
@@ -603,7 +640,7 @@ class Game(ConnectionListener):
         input_boxes = [name_input_box, ip_input_box]
         active_input_index = 0
 
-        play_text = font.render("Play", True, BLACK)
+        play_text = text_cache.render(font, "Play", True, BLACK)
         play_rect = play_text.get_rect(center=(width // 2, height * 3 // 4))
 
         while start_screen:
@@ -629,17 +666,6 @@ class Game(ConnectionListener):
                         self.player.name = player_name
                         self.ip_address = ip_address
                         self.player_name = player_name
-                        minimap_radius = (
-                            min(self.minimap.width, self.minimap.height) // 2
-                        )
-                        self.enemy = Enemy(
-                            random.randint(-400, 400),
-                            random.randint(-400, 400),
-                            ENEMY_SIZE,
-                            GREEN,
-                            100,
-                            minimap_radius,
-                        )
                         self.Connect((ip_address, 12345))
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_TAB:
@@ -651,17 +677,6 @@ class Game(ConnectionListener):
                         self.player.name = player_name
                         self.ip_address = ip_address
                         self.player_name = player_name
-                        minimap_radius = (
-                            min(self.minimap.width, self.minimap.height) // 2
-                        )
-                        self.enemy = Enemy(
-                            random.randint(-400, 400),
-                            random.randint(-400, 400),
-                            ENEMY_SIZE,
-                            GREEN,
-                            100,
-                            minimap_radius,
-                        )
                         self.Connect((ip_address, 12345))
                     elif name_active:
                         if event.key == pygame.K_RETURN:
@@ -682,29 +697,29 @@ class Game(ConnectionListener):
             ip_color = color_active if ip_active else color_inactive
 
             screen.fill(WHITE)
-            title_text = font.render("ProGame", True, BLACK)
+            title_text = text_cache.render(font, "ProGame", True, BLACK)
             title_rect = title_text.get_rect(center=(width // 2, height // 4))
             screen.blit(title_text, title_rect)
 
-            name_label = font.render("Name:", True, BLACK)
+            name_label = text_cache.render(font, "Name:", True, BLACK)
             name_label_rect = name_label.get_rect(
                 midright=(name_input_box.left - 10, name_input_box.centery)
             )
             screen.blit(name_label, name_label_rect)
 
             pygame.draw.rect(screen, name_color, name_input_box, 2)
-            name_text = font.render(player_name, True, BLACK)
+            name_text = text_cache.render(font, player_name, True, BLACK)
             screen.blit(name_text, (name_input_box.x + 5, name_input_box.y + 5))
             name_input_box.w = max(200, name_text.get_width() + 10)
 
-            ip_label = font.render("IP:", True, BLACK)
+            ip_label = text_cache.render(font, "IP:", True, BLACK)
             ip_label_rect = ip_label.get_rect(
                 midright=(ip_input_box.left - 10, ip_input_box.centery)
             )
             screen.blit(ip_label, ip_label_rect)
 
             pygame.draw.rect(screen, ip_color, ip_input_box, 2)
-            ip_text = font.render(ip_address, True, BLACK)
+            ip_text = text_cache.render(font, ip_address, True, BLACK)
             screen.blit(ip_text, (ip_input_box.x + 5, ip_input_box.y + 5))
             ip_input_box.w = max(200, ip_text.get_width() + 10)
 
@@ -713,84 +728,79 @@ class Game(ConnectionListener):
 
             pygame.display.flip()
 
-    def Network_game_state(self, data):
-        game_state = data["data"]
-
-        server_player_names = set(p["name"] for p in game_state["players"])
-        self.players = {
-            name: player
-            for name, player in self.players.items()
-            if name in server_player_names
-        }
-        for p in game_state["players"]:
-            if self.players.get(p["name"]) is None:
-                self.players[p["name"]] = Player(
+    def sync(self, game_state):
+        players = game_state["players"]
+        for player_id in [i for i in self.players if i not in players]:
+            del self.players[player_id]
+        for player_id, p in players.items():
+            player = self.players.get(player_id)
+            if player is None:
+                player = Player(
                     p["x"], p["y"], PLAYER_SIZE, RED, 300, p["name"], Money()
                 )
-            
-            if p["name"] == self.player.name:
-                self.player.health = p["health"]
-
-            player = self.players[p["name"]]
-            player.x = p["x"]
-            player.y = p["y"]
+                player.id = player_id
+                self.players[player_id] = player
+            player.name = p["name"]
             player.health = p["health"]
 
-        self.enemy.x = game_state["enemy"]["x"]
-        self.enemy.y = game_state["enemy"]["y"]
-        self.enemy.color = tuple(game_state["enemy"]["color"])
-        self.enemy.health = game_state["enemy"]["health"]
-        self.projectiles = [
-            Projectile(p["x"], p["y"], 5, RED, 0, [0, 0])
-            for p in game_state["projectiles"]
-            if p["name"] != self.player.name
-        ]
-
-        self.laser_beams = [
-            LaserBeam(
-                lb["start_point"][0],
-                lb["start_point"][1],
-                LASER_BEAM_SIZE,
-                RED,
-                0,
-                lb["angle"],
-                LASER_FADE_DURATION,
-            )
-            for lb in game_state["laser_beams"]
-        ]
-
-    def Network_chat(self, data):
-        message = data["message"]
-        sender = data["sender"]
-        if sender != self.player.name:
-            self.chat_box.chat_log.append(f"{sender}: {message}")
-
-    def draw_grid(self):
-        # Calculate the nearest multiple of 50 to the player's position
-        start_x = round(self.player.x / 50) * 50
-        start_y = round(self.player.y / 50) * 50
-
-        # Calculate the range of x values to cover the entire screen
-        min_x = start_x - (width // 2) - 50
-        max_x = start_x + (width // 2) + 50
-
-        # Draw vertical lines
-        for x in range(min_x - 500, max_x + 500, 50):
-            pygame.draw.line(
-                screen,
-                GRAY,
-                (x - self.player.x + width // 2, 0),
-                (x - self.player.x + width // 2, height),
-            )
+        enemies = game_state["enemies"]
+        for enemy_id in [i for i in self.enemies if i not in enemies]:
+            del self.enemies[enemy_id]
+        for enemy_id, e in enemies.items():
+            enemy = self.enemies.get(enemy_id)
+            if enemy is None:
+                enemy = Enemy(
+                    e["x"], e["y"], ENEMY_SIZE, GREEN, 100, self.minimap_radius
+                )
+                self.enemies[enemy_id] = enemy
+            enemy.color = tuple(e["color"])
+            enemy.health = e["health"]
+
+        # Our own projectiles are simulated locally in own_projectiles
+        projectiles = game_state["projectiles"]
+        for projectile_id in [i for i in self.projectiles if i not in projectiles]:
+            self.projectile_pool.release(self.projectiles.pop(projectile_id))
+        for projectile_id, p in projectiles.items():
+            if projectile_id not in self.projectiles and p["owner"] != self.player_id:
+                projectile = self.projectile_pool.acquire(p["x"], p["y"], [0, 0])
+                projectile.id = projectile_id
+                self.projectiles[projectile_id] = projectile
+
+        # Our own laser beams fade from the click in own_laser_beams
+        laser_beams = game_state["laser_beams"]
+        for laser_beam_id in [i for i in self.laser_beams if i not in laser_beams]:
+            self.laser_beam_pool.release(self.laser_beams.pop(laser_beam_id))
+        for laser_beam_id, lb in laser_beams.items():
+            if laser_beam_id not in self.laser_beams and lb["owner"] != self.player_id:
+                laser_beam = self.laser_beam_pool.acquire(
+                    lb["start_point"][0], lb["start_point"][1], lb["angle"]
+                )
+                laser_beam.id = laser_beam_id
+                self.laser_beams[laser_beam_id] = laser_beam
 
-        # Draw horizontal lines
-        for y in range(start_y - 1000, start_y + 1000, 50):
-            pygame.draw.line(
-                screen,
-                GRAY,
-                (0, y - self.player.y + height // 2),
-                (width, y - self.player.y + height // 2),
-            )
+    def interpolate(self):
+        # Remote entities are drawn between the snapshots around the render time
+        positions = self.snapshot_buffer.sample(time.monotonic())
+        if not positions:
+            return
+        players = positions["players"]
+        for player_id, player in self.players.items():
+            position = players.get(player_id)
+            if position is not None:
+                player.x, player.y = position
+        enemies = positions["enemies"]
+        for enemy_id, enemy in self.enemies.items():
+            position = enemies.get(enemy_id)
+            if position is not None:
+                enemy.x, enemy.y = position
+        projectiles = positions["projectiles"]
+        for projectile_id, projectile in self.projectiles.items():
+            position = projectiles.get(projectile_id)
+            if position is not None:
+                projectile.x, projectile.y = position
+
+    def chat_message(self, sender, message):
+        self.chat_box.add_message(f"{sender}: {message}")
 
     def run(self):
         self.running = True
@@ -804,7 +814,8 @@ class Game(ConnectionListener):
                 self.running = True
 
             while self.running:
-                dt = clock.tick(60) / 1000
+                ms = clock.tick(60)
+                dt = ms / 1000
                 self.Pump()
                 connection.Pump()
 
@@ -816,7 +827,7 @@ class Game(ConnectionListener):
                     self.shop_screen.draw(screen)
                     pygame.display.flip()
                     continue
-                
+
                 if self.player.health <= 0:
                     self.running = False
                     return
@@ -832,12 +843,9 @@ class Game(ConnectionListener):
                                 mouse_pos[1] - height // 2, mouse_pos[0] - width // 2
                             )
                             velocity = [math.cos(angle) * 400, math.sin(angle) * 400]
-                            projectile = Projectile(
+                            projectile = self.projectile_pool.acquire(
                                 self.player.x + self.player.size // 2,
                                 self.player.y + self.player.size // 2,
-                                5,
-                                RED,
-                                400,
                                 velocity,
                             )
                             self.own_projectiles.append(projectile)
@@ -857,16 +865,12 @@ class Game(ConnectionListener):
                             angle = math.atan2(
                                 mouse_pos[1] - height // 2, mouse_pos[0] - width // 2
                             )
-                            laser_beam = LaserBeam(
+                            laser_beam = self.laser_beam_pool.acquire(
                                 self.player.x + self.player.size // 2,
                                 self.player.y + self.player.size // 2,
-                                LASER_BEAM_SIZE,
-                                RED,
-                                0,
                                 angle,
-                                LASER_FADE_DURATION,
                             )
-                            self.laser_beams.append(laser_beam)
+                            self.own_laser_beams.append(laser_beam)
                             connection.Send(
                                 {
                                     "action": "laser_beam",
@@ -887,35 +891,45 @@ class Game(ConnectionListener):
                     self.chat_box.update(event, self.player, self)
 
                 keys = pygame.key.get_pressed()
-                self.player.move(dt, keys, self.player, self)
-                self.enemy.move(dt, (self.player.x, self.player.y))
+                input_keys = 0 if self.chat_active else self.player.move(dt, keys)
+                self.input_sender.update(ms, input_keys)
+                self.smooth_correction(dt)
+                self.interpolate()
 
                 for projectile in self.own_projectiles:
                     projectile.move(dt)
 
-                for laser_beam in self.laser_beams:
+                for laser_beam in self.laser_beams.values():
+                    laser_beam.move()
+                for laser_beam in self.own_laser_beams:
                     laser_beam.move()
 
-                    # Remove faded laser beams
-                    if laser_beam.is_faded():
-                        self.laser_beams.remove(laser_beam)
+                # Remove faded laser beams
+                for laser_beam in [lb for lb in self.own_laser_beams if lb.is_faded()]:
+                    self.own_laser_beams.remove(laser_beam)
+                    self.laser_beam_pool.release(laser_beam)
 
-                self.enemy.update(dt)
+                for enemy in self.enemies.values():
+                    enemy.update(dt)
                 self.player.update(dt)
                 for player in self.players.values():
                     player.update(dt)
 
-                self.projectiles = [
+                # The server only sends projectiles near us, but our own are
+                # simulated here until they leave the same range
+                for projectile in [
                     p
-                    for p in self.projectiles
-                    if abs(p.x - self.player.x) <= 1000
-                    and abs(p.y - self.player.y) <= 1000
-                ]
-
-                if (
-                    not DEBUG_MODE
-                    and abs(self.player.x - self.enemy.x) < self.player.size
-                    and abs(self.player.y - self.enemy.y) < self.player.size
+                    for p in self.own_projectiles
+                    if abs(p.x - self.player.x) > 1000
+                    or abs(p.y - self.player.y) > 1000
+                ]:
+                    self.own_projectiles.remove(projectile)
+                    self.projectile_pool.release(projectile)
+
+                if not DEBUG_MODE and any(
+                    abs(self.player.x - enemy.x) < self.player.size
+                    and abs(self.player.y - enemy.y) < self.player.size
+                    for enemy in self.enemies.values()
                 ):
                     self.running = False
                     print("Game Over! You lost.")
@@ -923,33 +937,39 @@ class Game(ConnectionListener):
                 self.offset_x = self.player.x - width // 2
                 self.offset_y = self.player.y - height // 2
 
-                screen.fill(WHITE)
-                self.draw_grid()
-                for projectile in self.projectiles:
+                self.background.draw(screen, self.offset_x, self.offset_y)
+                for projectile in self.projectiles.values():
                     projectile.draw(screen, self.offset_x, self.offset_y)
                 for projectile in self.own_projectiles:
                     projectile.draw(screen, self.offset_x, self.offset_y)
-                for laser_beam in self.laser_beams:
+                for laser_beam in self.laser_beams.values():
+                    if not laser_beam.is_faded():
+                        laser_beam.draw(screen, self.offset_x, self.offset_y)
+                for laser_beam in self.own_laser_beams:
                     laser_beam.draw(screen, self.offset_x, self.offset_y)
 
                 self.player.draw(screen, self.offset_x, self.offset_y)
                 self.player.draw_health_bar(screen, self.offset_x, self.offset_y)
-                self.enemy.draw(screen, self.offset_x, self.offset_y)
-                self.enemy.draw_health_bar(screen, self.offset_x, self.offset_y)
+                for enemy in self.enemies.values():
+                    enemy.draw(screen, self.offset_x, self.offset_y)
+                    enemy.draw_health_bar(screen, self.offset_x, self.offset_y)
 
                 for other_player in self.players.values():
                     # Do not draw the current player again
-                    if other_player.name == self.player.name:
+                    if other_player.id == self.player_id:
                         continue
                     other_player.draw(screen, self.offset_x, self.offset_y)
                     other_player.draw_health_bar(screen, self.offset_x, self.offset_y)
 
-                self.minimap.draw(screen, self.player, self.enemy)
+                self.minimap.draw(screen, self.player, self.enemies.values())
 
-                text = self.font.render(f"Cash: ${self.money.amount}", True, (0, 0, 0))
+                text = text_cache.render(
+                    self.font, f"Cash: ${self.money.amount}", True, (0, 0, 0)
+                )
                 text_rect = text.get_rect(center=(width - 75, 220))
 
-                coordinate_text = self.font.render(
+                coordinate_text = text_cache.render(
+                    self.font,
                     f"X: {int(self.player.x)//10}, Y: {int(self.player.y)//10}",
                     True,
                     (0, 0, 0),
@@ -959,6 +979,32 @@ class Game(ConnectionListener):
                 )
                 screen.blit(coordinate_text, coordinate_text_rect)
 
+                if DEBUG_MODE:
+                    correction_text = text_cache.render(
+                        self.font,
+                        f"Corrections: {self.corrections}, "
+                        f"last {self.last_correction:.1f}px, "
+                        f"max {self.max_correction:.1f}px",
+                        True,
+                        (0, 0, 0),
+                    )
+                    screen.blit(correction_text, (10, 10))
+                    allocation_text = text_cache.render(
+                        self.font,
+                        f"Allocations: projectiles {self.projectile_pool.allocations}, "
+                        f"beams {self.laser_beam_pool.allocations}",
+                        True,
+                        (0, 0, 0),
+                    )
+                    screen.blit(allocation_text, (10, 40))
+                    asset_text = text_cache.render(
+                        self.font,
+                        f"Assets: {atlas.hits} hits, {atlas.misses} misses",
+                        True,
+                        (0, 0, 0),
+                    )
+                    screen.blit(asset_text, (10, 70))
+
                 self.chat_box.draw(screen)
                 screen.blit(text, text_rect)
                 pygame.display.flip()
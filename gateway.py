@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+
+from server import ENEMY_COUNT, GameServer, build_parser, serve
+from shard import (
+    REGION_WIDTH,
+    new_departures,
+    player_state,
+    region_boundaries,
+    run_shard,
+    shard_for,
+)
+
+
+class GatewayServer(GameServer):
+    # Owns the client connections and sends the snapshots like GameServer, but
+    # the world is simulated by one WorldShard process per strip of the map.
+    # Each tick the clients' inputs and spawns go to the shard holding their
+    # player, all shards step in parallel, and then the entities that changed
+    # strips, the ghosts near the edges and the damage dealt across them are
+    # passed between the shards before the next tick.
+    def __init__(
+        self,
+        shards,
+        region_width=REGION_WIDTH,
+        enemy_count=ENEMY_COUNT,
+        **kwargs,
+    ):
+        self.boundaries = region_boundaries(shards, region_width)
+        self.connections = []
+        self.processes = []
+        # Started before the listening socket exists, so the workers do not
+        # inherit it
+        for index in range(shards):
+            gateway_end, shard_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_shard,
+                args=(
+                    shard_end,
+                    index,
+                    self.boundaries,
+                    enemy_count // shards + (index < enemy_count % shards),
+                    region_width,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(gateway_end)
+            self.processes.append(process)
+
+        # The gateway and every shard count up by shards + 1 from different
+        # starts, so they never hand out the same id
+        GameServer.__init__(self, enemy_count=0, id_stride=shards + 1, **kwargs)
+        self.id_marks = {}
+        self.reset_pending()
+
+    def reset_pending(self):
+        self.joins = [[] for _ in self.connections]
+        self.leaves = [set() for _ in self.connections]
+        self.spawned_projectiles = [[] for _ in self.connections]
+        self.spawned_laser_beams = []
+
+    def Connected(self, channel, addr):
+        GameServer.Connected(self, channel, addr)
+        channel.shard = shard_for(channel.player.x, self.boundaries)
+        self.joins[channel.shard].append(player_state(channel))
+
+    def remove_player(self, player):
+        GameServer.remove_player(self, player)
+        self.leaves[player.shard].add(player.id)
+
+    def add_projectile(self, x, y, velocity, owner, hostile):
+        self.spawned_projectiles[shard_for(x, self.boundaries)].append(
+            (self.new_entity_id(), x, y, velocity, owner, hostile)
+        )
+
+    def add_laser_beam(self, laser_beam):
+        # Beams are long enough to cross strips, so every shard gets a copy and
+        # hits the enemies it owns; the gateway keeps one for the snapshots
+        GameServer.add_laser_beam(self, laser_beam)
+        self.spawned_laser_beams.append(laser_beam)
+
+    def simulate(self, dt):
+        profiler = self.profiler
+        profiler.begin("tick")
+        self.time += dt
+        inputs = [{} for _ in self.connections]
+        for channel in self.players:
+            pending = channel.drain_inputs()
+            if pending:
+                inputs[channel.shard][channel.id] = pending
+        for index, connection in enumerate(self.connections):
+            connection.send(
+                (
+                    "tick",
+                    dt,
+                    self.joins[index],
+                    self.leaves[index],
+                    inputs[index],
+                    self.spawned_projectiles[index],
+                    self.spawned_laser_beams,
+                )
+            )
+        self.reset_pending()
+        profiler.mark("send")
+
+        replies = [connection.recv() for connection in self.connections]
+        profiler.mark("shards")
+
+        channels = {channel.id: channel for channel in self.players}
+        arrivals = [new_departures() for _ in self.connections]
+        ghosts = [([], []) for _ in self.connections]
+        damage = []
+        self.inputs_applied = self.inputs_coalesced = 0
+        for reply in replies:
+            for player_id, state in reply["players"].items():
+                if player_id in channels:
+                    self.mirror(channels[player_id], state)
+            for destination, departed in reply["departures"].items():
+                for section, entities in departed.items():
+                    arrivals[destination][section].extend(entities)
+                for state in departed["players"]:
+                    if state["id"] in channels:
+                        channels[state["id"]].shard = destination
+            for neighbour, (players, enemies) in reply["ghosts"].items():
+                ghosts[neighbour][0].extend(players)
+                ghosts[neighbour][1].extend(enemies)
+            damage.extend(reply["damage"])
+            self.inputs_applied += reply["inputs"][0]
+            self.inputs_coalesced += reply["inputs"][1]
+
+        for index, connection in enumerate(self.connections):
+            connection.send(
+                (
+                    "exchange",
+                    arrivals[index],
+                    ghosts[index][0],
+                    ghosts[index][1],
+                    damage,
+                )
+            )
+        profiler.mark("exchange")
+
+        for laser_beam in self.laser_beams:
+            laser_beam.move(dt)
+        self.laser_beams = [
+            laser_beam for laser_beam in self.laser_beams if not laser_beam.is_faded()
+        ]
+        profiler.count("players", len(self.players))
+        profiler.count("laser_beams", len(self.laser_beams))
+        profiler.end()
+
+    def mirror(self, channel, state):
+        player = channel.player
+        player.x = state["x"]
+        player.y = state["y"]
+        player.health = state["health"]
+        player.money.amount = state["money"]
+        player.has_laser_beam = state["has_laser_beam"]
+        channel.processed_input = state["processed_input"]
+
+    def game_state(self):
+        # Players and laser beams from the gateway, the rest from the shards
+        game_state = GameServer.game_state(self)
+        for connection in self.connections:
+            connection.send(("state",))
+        for connection in self.connections:
+            state = connection.recv()
+            game_state["enemies"].update(state["enemies"])
+            game_state["projectiles"].update(state["projectiles"])
+            self.id_marks[state["id_mark"] % self.id_stride] = state["id_mark"]
+        return game_state
+
+    def id_mark(self):
+        # Every shard counts its own ids up, so the mark is one per residue
+        marks = dict(self.id_marks)
+        marks[self.next_id % self.id_stride] = self.next_id
+        return marks
+
+    def existed(self, entity_id, mark):
+        return mark is not None and entity_id < mark.get(entity_id % self.id_stride, 0)
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("stop",))
+        for process in self.processes:
+            process.join()
+
+
+def main():
+    parser = build_parser("Run the game server with the map split between processes")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) - 1),
+        help="worker processes, one per vertical strip of the map",
+    )
+    parser.add_argument("--region-width", type=float, default=REGION_WIDTH)
+    args = parser.parse_args()
+    server = GatewayServer(
+        args.shards,
+        region_width=args.region_width,
+        enemy_count=args.enemies,
+        localaddr=(args.host, args.port),
+        transport=args.transport,
+        interest_radius=args.interest_radius,
+        tick_budget=1 / args.tick_rate,
+        traffic_interval=args.traffic_report,
+    )
+    try:
+        serve(server, args)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
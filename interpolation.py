@@ -0,0 +1,101 @@
+import bisect
+
+# Remote entities are drawn this far in the past, so there is normally a newer
+# snapshot to interpolate towards. Two snapshot intervals at 20 Hz.
+INTERPOLATION_DELAY = 0.1
+
+# How far past the newest snapshot positions are extrapolated when packets are
+# late, after which entities wait in place
+MAX_EXTRAPOLATION = 0.1
+
+BUFFER_CAPACITY = 32
+
+# The clock offset follows later arrivals slowly and earlier arrivals at once,
+# so it tracks the fastest path instead of the jitter
+OFFSET_SMOOTHING = 0.05
+
+INTERPOLATED_SECTIONS = ("players", "enemies", "projectiles")
+
+
+class SnapshotBuffer:
+    # Ring buffer of entity positions stamped with server time, sampled at a
+    # render time that trails the estimated server clock by the delay.
+    def __init__(
+        self,
+        delay=INTERPOLATION_DELAY,
+        max_extrapolation=MAX_EXTRAPOLATION,
+        capacity=BUFFER_CAPACITY,
+    ):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.capacity = capacity
+        self.times = []
+        self.positions = []
+        self.offset = None
+        self.extrapolated = 0
+
+    def add(self, local_time, server_time, snapshot):
+        if self.times and server_time <= self.times[-1]:
+            return
+
+        sample = local_time - server_time
+        if self.offset is None or sample < self.offset:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * OFFSET_SMOOTHING
+
+        self.times.append(server_time)
+        self.positions.append(
+            {
+                section: {
+                    entity_id: (record["x"], record["y"])
+                    for entity_id, record in snapshot[section].items()
+                }
+                for section in INTERPOLATED_SECTIONS
+            }
+        )
+        if len(self.times) > self.capacity:
+            del self.times[0]
+            del self.positions[0]
+
+    def render_time(self, local_time):
+        return local_time - self.offset - self.delay
+
+    def sample(self, local_time):
+        # {section: {entity_id: (x, y)}} for the entities in the newer of the
+        # two snapshots around the render time
+        if not self.times:
+            return {}
+
+        render_time = self.render_time(local_time)
+        i = bisect.bisect_right(self.times, render_time)
+        if i == 0 or len(self.times) == 1:
+            return self.positions[min(i, len(self.times) - 1)]
+
+        if i == len(self.times):
+            self.extrapolated += 1
+            i -= 1
+            render_time = min(render_time, self.times[i] + self.max_extrapolation)
+
+        t0 = self.times[i - 1]
+        t1 = self.times[i]
+        alpha = (render_time - t0) / (t1 - t0)
+        older = self.positions[i - 1]
+        newer = self.positions[i]
+
+        sampled = {}
+        for section, records in newer.items():
+            old_records = older[section]
+            section_positions = {}
+            for entity_id, (x1, y1) in records.items():
+                old = old_records.get(entity_id)
+                if old is None:
+                    section_positions[entity_id] = (x1, y1)
+                else:
+                    x0, y0 = old
+                    section_positions[entity_id] = (
+                        x0 + (x1 - x0) * alpha,
+                        y0 + (y1 - y0) * alpha,
+                    )
+            sampled[section] = section_positions
+        return sampled
@@ -0,0 +1,18 @@
+# Player movement shared by the server and the client's prediction, so that
+# replaying the same inputs on either side lands on the same position
+INPUT_UP = 1
+INPUT_DOWN = 2
+INPUT_LEFT = 4
+INPUT_RIGHT = 8
+
+
+def apply_input(x, y, keys, speed, dt):
+    if keys & INPUT_UP:
+        y -= speed * dt
+    if keys & INPUT_DOWN:
+        y += speed * dt
+    if keys & INPUT_LEFT:
+        x -= speed * dt
+    if keys & INPUT_RIGHT:
+        x += speed * dt
+    return x, y
@@ -0,0 +1,100 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# Ticks kept per phase for the rolling percentiles
+PROFILE_WINDOW = 600
+PERCENTILES = (50, 95, 99)
+
+
+class TickProfiler:
+    # Splits each pass of the server loop (a simulation tick, a snapshot or a
+    # pump) into named phases: begin() starts a pass, mark() closes the phase
+    # that just ran and end() records it. Disabled, every call returns at once.
+    def __init__(
+        self, budget, window=PROFILE_WINDOW, clock=time.perf_counter, log=print
+    ):
+        self.budget = budget
+        self.window = window
+        self.clock = clock
+        self.log = log
+        self.enabled = False
+        self.timings = {}
+        self.counts = {}
+        self.slow_passes = 0
+        self.kind = None
+        self.started = 0
+        self.last = 0
+        self.phases = []
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.kind = None
+        return self.enabled
+
+    def begin(self, kind):
+        if not self.enabled:
+            return
+        self.kind = kind
+        self.phases = []
+        self.started = self.last = self.clock()
+
+    def mark(self, phase):
+        if self.kind is None:
+            return
+        now = self.clock()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def count(self, name, value):
+        if self.kind is None:
+            return
+        self.record(self.counts, name, value)
+
+    def end(self):
+        if self.kind is None:
+            return
+        total = self.clock() - self.started
+        self.record(self.timings, self.kind, total)
+        for phase, elapsed in self.phases:
+            self.record(self.timings, f"{self.kind}.{phase}", elapsed)
+
+        if total > self.budget:
+            self.slow_passes += 1
+            breakdown = ", ".join(
+                f"{phase} {elapsed * 1000:.2f}" for phase, elapsed in self.phases
+            )
+            self.log(f"Slow {self.kind}: {total * 1000:.2f} ms ({breakdown})")
+        self.kind = None
+
+    def record(self, series, name, value):
+        samples = series.get(name)
+        if samples is None:
+            samples = deque(maxlen=self.window)
+            series[name] = samples
+        samples.append(value)
+
+    def summary(self, series):
+        # {name: (p50, p95, p99, max)}
+        return {
+            name: tuple(np.percentile(samples, PERCENTILES)) + (max(samples),)
+            for name, samples in series.items()
+            if samples
+        }
+
+    def report(self):
+        lines = [
+            f"{'phase':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        ]
+        for name, values in sorted(self.summary(self.timings).items()):
+            lines.append(
+                f"{name:<24} " + " ".join(f"{value * 1000:>8.3f}" for value in values)
+            )
+        lines.append(f"{'count':<24} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name, values in sorted(self.summary(self.counts).items()):
+            lines.append(
+                f"{name:<24} " + " ".join(f"{value:>8.0f}" for value in values)
+            )
+        lines.append(f"Slow passes: {self.slow_passes}")
+        return "\n".join(lines)
@@ -0,0 +1,147 @@
+import numpy as np
+
+from spatial import cell_keys
+
+
+class ProjectilePool:
+    # Structure-of-arrays store for server projectiles. Live projectiles occupy
+    # the first `count` slots; removals swap the tail into the holes so the live
+    # range stays dense without shifting everything after it.
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.owners = np.zeros(capacity, dtype=np.int64)
+        self.hostile = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        capacity = len(self.ids) * 2
+        for name in ("ids", "positions", "velocities", "owners", "hostile", "alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def add(self, entity_id, x, y, velocity, owner, hostile):
+        if self.count == len(self.ids):
+            self.grow()
+        i = self.count
+        self.ids[i] = entity_id
+        self.positions[i] = (x, y)
+        self.velocities[i] = velocity
+        self.owners[i] = owner
+        self.hostile[i] = hostile
+        self.alive[i] = True
+        self.count += 1
+
+    def add_many(self, ids, positions, velocities, owners, hostile):
+        k = len(ids)
+        if k == 0:
+            return
+        while self.count + k > len(self.ids):
+            self.grow()
+        s = slice(self.count, self.count + k)
+        self.ids[s] = ids
+        self.positions[s] = positions
+        self.velocities[s] = velocities
+        self.owners[s] = owners
+        self.hostile[s] = hostile
+        self.alive[s] = True
+        self.count += k
+
+    def move(self, dt):
+        n = self.count
+        self.positions[:n] += self.velocities[:n] * dt
+
+    def hits(self, grid, boxes, sizes, hostile):
+        # First box (in order) each live projectile of the given side is strictly
+        # inside. grid is a SpatialHash of box indices; a point lies in exactly
+        # one cell, so only the boxes listed in that cell need testing. Returns
+        # parallel arrays of projectile and box indices.
+        n = self.count
+        none = np.empty(0, dtype=np.int64)
+        if n == 0 or not grid.cells:
+            return none, none
+
+        candidates = np.flatnonzero(self.alive[:n] & (self.hostile[:n] == hostile))
+        if len(candidates) == 0:
+            return none, none
+
+        keys = cell_keys(self.positions[candidates], grid.cell_size)
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        occupied = np.fromiter(grid.cells, dtype=np.int64, count=len(grid.cells))
+        starts = np.searchsorted(sorted_keys, occupied, "left")
+        ends = np.searchsorted(sorted_keys, occupied, "right")
+
+        hit_projectiles = []
+        hit_boxes = []
+        for key, start, end in zip(occupied.tolist(), starts.tolist(), ends.tolist()):
+            if start == end:
+                continue
+            indices = candidates[order[start:end]]
+            box_indices = np.array(sorted(grid.cells[key]))
+            points = self.positions[indices]
+            px = points[:, 0:1]
+            py = points[:, 1:2]
+            left = boxes[box_indices, 0]
+            top = boxes[box_indices, 1]
+            box_sizes = sizes[box_indices]
+            inside = (
+                (left < px)
+                & (px < left + box_sizes)
+                & (top < py)
+                & (py < top + box_sizes)
+            )
+            hit = inside.any(axis=1)
+            if hit.any():
+                hit_projectiles.append(indices[hit])
+                hit_boxes.append(box_indices[inside[hit].argmax(axis=1)])
+
+        if not hit_projectiles:
+            return none, none
+        return np.concatenate(hit_projectiles), np.concatenate(hit_boxes)
+
+    def kill(self, indices):
+        self.alive[indices] = False
+
+    def kill_outside(self, center, radius):
+        n = self.count
+        offset = np.abs(self.positions[:n] - center)
+        self.alive[:n] &= (offset <= radius).all(axis=1)
+
+    def compact(self):
+        n = self.count
+        dead = np.flatnonzero(~self.alive[:n])
+        if len(dead) == 0:
+            return
+
+        new_count = n - len(dead)
+        holes = dead[dead < new_count]
+        tail = np.arange(new_count, n)
+        movers = tail[self.alive[new_count:n]]
+
+        for array in (
+            self.ids,
+            self.positions,
+            self.velocities,
+            self.owners,
+            self.hostile,
+            self.alive,
+        ):
+            array[holes] = array[movers]
+        self.alive[new_count:n] = False
+        self.count = new_count
+
+    def records(self):
+        n = self.count
+        return zip(
+            self.ids[:n].tolist(),
+            self.positions[:n].tolist(),
+            self.owners[:n].tolist(),
+        )
@@ -0,0 +1,346 @@
+import math
+import struct
+
+from PodSixNet.Channel import Channel
+from PodSixNet.rencode import dumps, loads
+
+# Binary frames share PodSixNet's terminator-delimited stream with the rencoded
+# dict messages. They start with a byte no dict message starts with, and every
+# "-" in the payload is followed by an 0x01 escape so the "\0---\0" terminator
+# cannot appear. Dashes are rare in packed numbers, unlike NULs.
+PROTOCOL_VERSION = 5
+PACKED_MARKER = b"\xff"
+TERMINATOR = Channel.endchars.encode()
+
+POSITION_SCALE = 8
+VELOCITY_SCALE = 8
+ANGLE_SCALE = 65536 / (2 * math.pi)
+
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+COLORS = (GREEN, RED)
+COLOR_CODES = {color: code for code, color in enumerate(COLORS)}
+
+MESSAGE_GAME_STATE = 1
+MESSAGE_MOVE = 2
+MESSAGE_PROJECTILE = 3
+
+HEADER = struct.Struct("<BB")
+GAME_STATE_HEADER = struct.Struct("<III")
+BLOCK_HEADER = struct.Struct("<BBH")
+RECORD_HEADER = struct.Struct("<IB")
+STRING_LENGTH = struct.Struct("<B")
+MOVE = struct.Struct("<IBH")
+PROJECTILE = struct.Struct("<iihh")
+
+BLOCK_CHANGED = 0
+BLOCK_REMOVED = 1
+BLOCK_ENTERED = 2
+BLOCK_LEFT = 3
+BLOCK_KINDS = ("changed", "removed", "entered", "left")
+
+
+def _position(value):
+    return round(value * POSITION_SCALE)
+
+
+def _unposition(value):
+    return value / POSITION_SCALE
+
+
+def _point(value):
+    return (_position(value[0]), _position(value[1]))
+
+
+def _unpoint(value):
+    return (_unposition(value[0]), _unposition(value[1]))
+
+
+def _angle(value):
+    return round(value * ANGLE_SCALE) % 65536
+
+
+def _unangle(value):
+    angle = value / ANGLE_SCALE
+    return angle - 2 * math.pi if angle > math.pi else angle
+
+
+def _color(value):
+    return COLOR_CODES[tuple(value)]
+
+
+def _uncolor(value):
+    return COLORS[value]
+
+
+def _same(value):
+    return value
+
+
+# Per-section record layouts: (field, struct format, encode, decode). A format of
+# None marks a length-prefixed UTF-8 string, which always goes after the fixed
+# part of the record.
+SECTIONS = (
+    (
+        "players",
+        (
+            ("x", "i", _position, _unposition),
+            ("y", "i", _position, _unposition),
+            ("money", "i", _same, _same),
+            ("has_laser_beam", "?", _same, _same),
+            ("health", "h", _same, _same),
+            ("input_seq", "I", _same, _same),
+            ("name", None, _same, _same),
+        ),
+    ),
+    (
+        "enemies",
+        (
+            ("x", "i", _position, _unposition),
+            ("y", "i", _position, _unposition),
+            ("color", "B", _color, _uncolor),
+            ("health", "h", _same, _same),
+        ),
+    ),
+    (
+        "projectiles",
+        (
+            ("x", "i", _position, _unposition),
+            ("y", "i", _position, _unposition),
+            ("owner", "I", _same, _same),
+        ),
+    ),
+    (
+        "laser_beams",
+        (
+            ("start_point", "ii", _point, _unpoint),
+            ("angle", "H", _angle, _unangle),
+            ("owner", "I", _same, _same),
+        ),
+    ),
+)
+SECTION_CODES = {section: code for code, (section, _) in enumerate(SECTIONS)}
+
+_layouts = {}
+
+
+def _layout(code, mask):
+    layout = _layouts.get((code, mask))
+    if layout is None:
+        fields = [
+            field for bit, field in enumerate(SECTIONS[code][1]) if mask & (1 << bit)
+        ]
+        fixed = [field for field in fields if field[1] is not None]
+        strings = [field for field in fields if field[1] is None]
+        fmt = struct.Struct("<" + "".join(field[1] for field in fixed))
+        layout = (fmt, fixed, strings)
+        _layouts[(code, mask)] = layout
+    return layout
+
+
+def _pack_string(value):
+    raw = value.encode("utf8")[:255]
+    return STRING_LENGTH.pack(len(raw)) + raw
+
+
+def _unpack_string(payload, offset):
+    (length,) = STRING_LENGTH.unpack_from(payload, offset)
+    offset += STRING_LENGTH.size
+    return payload[offset : offset + length].decode("utf8", "replace"), offset + length
+
+
+def _pack_values(fields, record):
+    values = []
+    for name, fmt, encode, _ in fields:
+        value = encode(record[name])
+        if len(fmt) > 1:
+            values.extend(value)
+        else:
+            values.append(value)
+    return values
+
+
+def _pack_game_state(data):
+    parts = [
+        GAME_STATE_HEADER.pack(
+            data["seq"], 0 if data["base"] is None else data["base"], data["time"]
+        )
+    ]
+
+    for section, records in data["changed"].items():
+        code = SECTION_CODES[section]
+        parts.append(BLOCK_HEADER.pack(code, BLOCK_CHANGED, len(records)))
+        fields = SECTIONS[code][1]
+        for entity_id, record in records.items():
+            mask = 0
+            for bit, field in enumerate(fields):
+                if field[0] in record:
+                    mask |= 1 << bit
+            fmt, fixed, strings = _layout(code, mask)
+            parts.append(RECORD_HEADER.pack(entity_id, mask))
+            parts.append(fmt.pack(*_pack_values(fixed, record)))
+            for name, _, _, _ in strings:
+                parts.append(_pack_string(record[name]))
+
+    for kind in (BLOCK_REMOVED, BLOCK_ENTERED, BLOCK_LEFT):
+        for section, entity_ids in data.get(BLOCK_KINDS[kind], {}).items():
+            parts.append(
+                BLOCK_HEADER.pack(SECTION_CODES[section], kind, len(entity_ids))
+            )
+            parts.append(struct.pack(f"<{len(entity_ids)}I", *entity_ids))
+
+    return b"".join(parts)
+
+
+def _unpack_game_state(payload, offset):
+    seq, base, time = GAME_STATE_HEADER.unpack_from(payload, offset)
+    offset += GAME_STATE_HEADER.size
+    data = {
+        "seq": seq,
+        "base": base or None,
+        "time": time,
+        "changed": {},
+        "removed": {},
+        "entered": {},
+        "left": {},
+    }
+
+    while offset < len(payload):
+        code, kind, count = BLOCK_HEADER.unpack_from(payload, offset)
+        offset += BLOCK_HEADER.size
+        section = SECTIONS[code][0]
+
+        if kind != BLOCK_CHANGED:
+            data[BLOCK_KINDS[kind]][section] = list(
+                struct.unpack_from(f"<{count}I", payload, offset)
+            )
+            offset += 4 * count
+            continue
+
+        records = data["changed"].setdefault(section, {})
+        for _ in range(count):
+            entity_id, mask = RECORD_HEADER.unpack_from(payload, offset)
+            offset += RECORD_HEADER.size
+            fmt, fixed, strings = _layout(code, mask)
+            values = fmt.unpack_from(payload, offset)
+            offset += fmt.size
+
+            record = {}
+            index = 0
+            for name, field_fmt, _, decode in fixed:
+                width = len(field_fmt)
+                if width > 1:
+                    record[name] = decode(values[index : index + width])
+                else:
+                    record[name] = decode(values[index])
+                index += width
+            for name, _, _, _ in strings:
+                record[name], offset = _unpack_string(payload, offset)
+            records[entity_id] = record
+
+    return data
+
+
+def _pack_move(data):
+    return MOVE.pack(data["seq"], data["keys"], data["dt"])
+
+
+def _unpack_move(payload, offset):
+    seq, keys, dt = MOVE.unpack_from(payload, offset)
+    return {"action": "move", "seq": seq, "keys": keys, "dt": dt}
+
+
+def _pack_projectile(data):
+    velocity = data["velocity"]
+    return PROJECTILE.pack(
+        _position(data["x"]),
+        _position(data["y"]),
+        round(velocity[0] * VELOCITY_SCALE),
+        round(velocity[1] * VELOCITY_SCALE),
+    ) + _pack_string(data["name"])
+
+
+def _unpack_projectile(payload, offset):
+    x, y, vx, vy = PROJECTILE.unpack_from(payload, offset)
+    name, _ = _unpack_string(payload, offset + PROJECTILE.size)
+    return {
+        "action": "projectile",
+        "x": _unposition(x),
+        "y": _unposition(y),
+        "velocity": [vx / VELOCITY_SCALE, vy / VELOCITY_SCALE],
+        "name": name,
+    }
+
+
+PACKERS = {
+    "game_state": (MESSAGE_GAME_STATE, lambda data: _pack_game_state(data["data"])),
+    "move": (MESSAGE_MOVE, _pack_move),
+    "projectile": (MESSAGE_PROJECTILE, _pack_projectile),
+}
+UNPACKERS = {
+    MESSAGE_GAME_STATE: lambda payload, offset: {
+        "action": "game_state",
+        "data": _unpack_game_state(payload, offset),
+    },
+    MESSAGE_MOVE: _unpack_move,
+    MESSAGE_PROJECTILE: _unpack_projectile,
+}
+
+
+def pack_message(data):
+    packer = PACKERS.get(data["action"])
+    if packer is None:
+        return None
+    message_type, pack = packer
+    payload = HEADER.pack(PROTOCOL_VERSION, message_type) + pack(data)
+    return PACKED_MARKER + payload.replace(b"-", b"-\1") + TERMINATOR
+
+
+def unpack_frame(frame):
+    if frame[:1] != PACKED_MARKER:
+        return None
+    payload = frame[1:].replace(b"-\1", b"-")
+    version, message_type = HEADER.unpack_from(payload)
+    if version != PROTOCOL_VERSION or message_type not in UNPACKERS:
+        return {"action": "unsupported", "version": version, "type": message_type}
+    return UNPACKERS[message_type](payload, HEADER.size)
+
+
+def decode_frame(frame):
+    data = unpack_frame(frame)
+    if data is None:
+        data = loads(frame)
+    return data
+
+
+def encode_message(data, protocol=0):
+    # Peers that never negotiated a protocol keep getting rencoded dicts
+    if protocol:
+        outgoing = pack_message(data)
+        if outgoing is not None:
+            return outgoing
+    return dumps(data) + TERMINATOR
+
+
+class PackedChannelMixin:
+    protocol = 0
+
+    def Send(self, data):
+        outgoing = encode_message(data, self.protocol)
+        self.SendFrame(outgoing, data["action"])
+        return len(outgoing)
+
+    def SendFrame(self, frame, action):
+        self.sendqueue.append(frame)
+
+    def found_terminator(self):
+        # Size of the frame being dispatched, for traffic accounting
+        self.frame_size = len(self._ibuffer) + len(TERMINATOR)
+        data = unpack_frame(self._ibuffer)
+        if data is None:
+            return super().found_terminator()
+
+        self._ibuffer = b""
+        for n in ("Network_" + data["action"], "Network"):
+            if hasattr(self, n):
+                getattr(self, n)(data)
@@ -0,0 +1,94 @@
+import time
+
+TICK_RATE = 60
+SNAPSHOT_RATE = 20
+PUMP_RATE = 120
+MAX_CATCHUP_TICKS = 5
+
+# Sleep this much less than the time to the next deadline and spin the rest,
+# since OS sleeps routinely overshoot by a millisecond or more
+SLEEP_MARGIN = 0.001
+
+
+def advance(deadline, step, now):
+    # Periodic work that fell behind skips the missed slots instead of bursting
+    deadline += step
+    if deadline <= now:
+        deadline = now + step
+    return deadline
+
+
+class FixedStepScheduler:
+    # Runs the simulation at a fixed step from an accumulator, independently of
+    # how often snapshots are broadcast and how often the network is pumped.
+    def __init__(
+        self,
+        tick_rate=TICK_RATE,
+        snapshot_rate=SNAPSHOT_RATE,
+        pump_rate=PUMP_RATE,
+        max_catchup_ticks=MAX_CATCHUP_TICKS,
+        clock=time.perf_counter,
+        sleep=time.sleep,
+    ):
+        self.tick_step = 1 / tick_rate
+        self.snapshot_step = 1 / snapshot_rate
+        self.pump_step = 1 / pump_rate
+        self.max_catchup_ticks = max_catchup_ticks
+        self.clock = clock
+        self.sleep = sleep
+
+        self.accumulator = 0
+        self.last_time = None
+        self.next_snapshot = None
+        self.next_pump = None
+
+        self.ticks = 0
+        self.snapshots = 0
+        self.pumps = 0
+        self.dropped_ticks = 0
+
+    def step(self, simulate, snapshot, pump):
+        now = self.clock()
+        if self.last_time is None:
+            self.last_time = now
+            self.next_snapshot = now
+            self.next_pump = now
+
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        if now >= self.next_pump:
+            pump()
+            self.pumps += 1
+            self.next_pump = advance(self.next_pump, self.pump_step, now)
+
+        ticks = 0
+        while self.accumulator >= self.tick_step:
+            if ticks == self.max_catchup_ticks:
+                # Too far behind to catch up; drop the backlog instead of
+                # spiralling into ever longer frames
+                dropped = int(self.accumulator / self.tick_step)
+                self.dropped_ticks += dropped
+                self.accumulator -= dropped * self.tick_step
+                break
+            simulate(self.tick_step)
+            self.accumulator -= self.tick_step
+            self.ticks += 1
+            ticks += 1
+
+        if now >= self.next_snapshot:
+            snapshot()
+            self.snapshots += 1
+            self.next_snapshot = advance(self.next_snapshot, self.snapshot_step, now)
+            # Flush the snapshot now rather than at the next pump deadline
+            pump()
+            self.pumps += 1
+
+        next_tick = now + self.tick_step - self.accumulator
+        return min(next_tick, self.next_snapshot, self.next_pump) - self.clock()
+
+    def run(self, simulate, snapshot, pump):
+        while True:
+            wait = self.step(simulate, snapshot, pump)
+            if wait > SLEEP_MARGIN:
+                self.sleep(wait - SLEEP_MARGIN)
@@ -1,8 +1,33 @@
-from PodSixNet.Server import Server
-from PodSixNet.Channel import Channel
+import argparse
 import random
-import pygame
 import math
+import signal
+import time
+import numpy as np
+from chat import ChatService
+from enemies import EnemyManager
+from movement import apply_input
+from projectiles import ProjectilePool
+from scheduler import (
+    MAX_CATCHUP_TICKS,
+    PUMP_RATE,
+    SNAPSHOT_RATE,
+    TICK_RATE,
+    FixedStepScheduler,
+)
+from profiler import TickProfiler
+from protocol import PROTOCOL_VERSION, encode_message
+from traffic import RECEIVED, SENT, TrafficStats, traffic_report
+from snapshot import SnapshotHistory, diff_snapshots, filter_snapshot
+from spatial import SpatialHash
+from transport import (
+    LocalChannel,
+    LocalServer,
+    TcpChannel,
+    TcpServer,
+    UdpChannel,
+    UdpServer,
+)
 
 # Define colors
 RED = (255, 0, 0)
@@ -18,195 +43,597 @@ ENEMY_SIZE = 100
 # Define damage constants
 PROJECTILE_DAMAGE = 10
 LASER_DAMAGE = 30
+LASER_LENGTH = 1000
 
+# Enemy behaviour constants
+ENEMY_COUNT = 1
+ENEMY_FIRE_CHANCE = 0.01
+PROJECTILE_SPEED = 400
 
-class ClientChannel(Channel):
+# Half-width of the square around a player inside which entities are sent to it
+INTEREST_RADIUS = 1000
+
+# Inputs a client may have queued between two ticks; older ones are dropped
+MAX_PENDING_INPUTS = 16
+
+# Seconds of movement a client can bank while its inputs are in flight. Inputs
+# beyond the time the server has actually simulated are cut short.
+MAX_INPUT_BUDGET = 0.25
+
+# Largest coordinate or velocity accepted from a client, well inside what the
+# packed snapshots can carry
+MAX_CLIENT_VALUE = 1e6
+
+
+def client_number(value):
+    # Clients can send anything in a dict message; NaN fails the comparison
+    return isinstance(value, (int, float)) and abs(value) <= MAX_CLIENT_VALUE
+
+
+def client_integer(value, limit):
+    return isinstance(value, int) and 0 <= value < limit
+
+
+class ClientChannel:
+    # Message handlers for one connected client, independent of the transport.
+    # Concrete channel classes combine this with TcpChannel or UdpChannel.
     def __init__(self, *args, **kwargs):
         self.player = Player(0, 0, PLAYER_SIZE, RED, 300, "", Money())
-        Channel.__init__(self, *args, **kwargs)
+        self.id = None
+        self.acked_seq = None
+        self.snapshots = SnapshotHistory()
+        self.inputs = []
+        self.input_seq = 0
+        self.processed_input = 0
+        self.input_budget = 0
+        self.traffic = TrafficStats()
+        self.frame_size = 0
+        super().__init__(*args, **kwargs)
+
+    def SendFrame(self, frame, action):
+        self.traffic.count(SENT, action, len(frame))
+        self._server.traffic.count(SENT, action, len(frame))
+        super().SendFrame(frame, action)
+
+    def Network(self, data):
+        # Runs after the Network_<action> handler, for every message
+        self.traffic.count(RECEIVED, data["action"], self.frame_size)
+        self._server.traffic.count(RECEIVED, data["action"], self.frame_size)
 
     def Network_move(self, data):
-        self.player.x = data["x"]
-        self.player.y = data["y"]
-        self.player.name = data["name"]
+        # Queued until the next tick; duplicates and late datagrams are dropped,
+        # and so is anything the packed move could not have carried
+        if not (
+            client_integer(data["seq"], 1 << 32)
+            and client_integer(data["keys"], 1 << 8)
+            and client_integer(data["dt"], 1 << 16)
+        ):
+            return
+        if data["seq"] <= self.input_seq:
+            return
+        self.input_seq = data["seq"]
+        self.inputs.append(data)
+        if len(self.inputs) > MAX_PENDING_INPUTS:
+            del self.inputs[0]
+
+    def drain_inputs(self):
+        inputs = self.inputs
+        self.inputs = []
+        return inputs
 
     def Network_projectile(self, data):
-        projectile = Projectile(
-            data["x"], data["y"], 5, RED, 400, data["velocity"], data["name"]
+        velocity = data["velocity"]
+        if not (
+            client_number(data["x"])
+            and client_number(data["y"])
+            and isinstance(velocity, (list, tuple))
+            and len(velocity) == 2
+            and all(client_number(v) for v in velocity)
+        ):
+            return
+        self._server.add_projectile(
+            data["x"], data["y"], list(velocity), self.id, False
         )
-        self._server.projectiles.append(projectile)
 
     def Network_laser_beam(self, data):
+        if not all(client_number(data[key]) for key in ("x", "y", "angle")):
+            return
         laser_beam = LaserBeam(data["x"], data["y"], 2, RED, 0, data["angle"], 0.5)
-        self._server.laser_beams.append(laser_beam)
+        laser_beam.owner = self.id
+        self._server.add_laser_beam(laser_beam)
+
+    def Network_hello(self, data):
+        # Frames are only ever packed in the current version, so any other
+        # client gets rencoded dicts, which every version understands
+        self.protocol = PROTOCOL_VERSION if data["protocol"] == PROTOCOL_VERSION else 0
+        self.player.name = str(data.get("name", ""))
+        self.Send({"action": "hello", "protocol": self.protocol, "id": self.id})
+
+    def Network_ping(self, data):
+        # Echoed back at once so clients can measure the round trip
+        self.Send({"action": "pong", "id": data["id"]})
+
+    def Network_ack(self, data):
+        # Only snapshots that were actually sent can be acked
+        seq = data["seq"]
+        if not client_integer(seq, 1 << 32) or seq > self._server.seq:
+            return
+        if self.acked_seq is None or seq > self.acked_seq:
+            self.acked_seq = seq
 
     def Network_chat(self, data):
-        message = data["message"]
-        sender = data["sender"]
-        self._server.broadcast_chat(message, sender)
+        # The sender is whoever owns the channel, not what the client claims
+        self._server.chat.post(self, self.player.name, str(data["message"]))
 
     def Close(self):
         self._server.remove_player(self)
 
 
-class GameServer(Server):
-    channelClass = ClientChannel
+class TcpClientChannel(ClientChannel, TcpChannel):
+    pass
 
-    def __init__(self, *args, **kwargs):
+
+class UdpClientChannel(ClientChannel, UdpChannel):
+    pass
+
+
+class LocalClientChannel(ClientChannel, LocalChannel):
+    pass
+
+
+class GameServer:
+    def __init__(
+        self,
+        localaddr=("0.0.0.0", 12345),
+        transport="tcp",
+        interest_radius=INTEREST_RADIUS,
+        enemy_count=ENEMY_COUNT,
+        tick_budget=1 / TICK_RATE,
+        traffic_interval=0,
+        id_offset=0,
+        id_stride=1,
+    ):
+        self.interest_radius = interest_radius
+        self.profiler = TickProfiler(tick_budget)
         self.players = []
-        self.enemy = Enemy(
-            random.randint(-400, 400),
-            random.randint(-400, 400),
-            ENEMY_SIZE,
-            GREEN,
-            100,
-            100,
-        )
-        self.projectiles = []
+        self.projectiles = ProjectilePool()
         self.laser_beams = []
-        self.frame_time = 0
-        self.clock = pygame.time.Clock()  # Add this line
-        Server.__init__(self, *args, **kwargs)
+        self.chat = ChatService()
+        self.traffic = TrafficStats()
+        self.traffic_interval = traffic_interval
+        self.traffic_reported = time.monotonic()
+        # Entity ids count up by id_stride from 1 + id_offset, so that several
+        # servers sharing one world hand out disjoint ids
+        self.next_id = 1 + id_offset
+        self.id_stride = id_stride
+        self.enemies = EnemyManager(ENEMY_SIZE, 100, 100)
+        for _ in range(enemy_count):
+            self.enemies.spawn(
+                self.new_entity_id(),
+                random.randint(-400, 400),
+                random.randint(-400, 400),
+            )
+        self.seq = 0
+        self.time = 0
+        self.encodes = 0
+        self.encodes_saved = 0
+        self.inputs_applied = 0
+        self.inputs_coalesced = 0
+        if transport == "udp":
+            self.transport = UdpServer(self, localaddr, UdpClientChannel)
+        elif transport == "local":
+            self.transport = LocalServer(self, localaddr, LocalClientChannel)
+        else:
+            self.transport = TcpServer(self, localaddr, TcpClientChannel)
         print("Server launched")
 
+    def Pump(self):
+        self.profiler.begin("pump")
+        self.transport.Pump()
+        self.profiler.mark("network")
+        self.measure_traffic()
+        self.profiler.mark("traffic")
+        self.profiler.end()
+
+    def measure_traffic(self):
+        # What is left in the send buffers once the transport has written all
+        # it could; a growing backlog means a client cannot keep up
+        backlog = 0
+        for channel in self.players:
+            channel.traffic.gauge(channel.send_backlog())
+            backlog += channel.traffic.backlog
+        self.traffic.gauge(backlog)
+
+        now = time.monotonic()
+        elapsed = now - self.traffic_reported
+        if self.traffic_interval and elapsed >= self.traffic_interval:
+            print(traffic_report(self.traffic, self.players, elapsed))
+            self.traffic.reset_window()
+            for channel in self.players:
+                channel.traffic.reset_window()
+            self.traffic_reported = now
+
     def Connected(self, channel, addr):
         print(f"New connection: {channel}")
+        channel.id = self.new_entity_id()
         self.players.append(channel)
+        backlog = self.chat.backlog()
+        if backlog:
+            channel.Send({"action": "chat", "messages": backlog})
 
     def remove_player(self, player):
         print(f"Player disconnected: {player}")
         self.players.remove(player)
+        self.chat.remove(player)
 
-    def distance(self, obj1, obj2):
-        return math.sqrt((obj1.x - obj2.x) ** 2 + (obj1.y - obj2.y) ** 2)
+    def new_entity_id(self):
+        entity_id = self.next_id
+        self.next_id += self.id_stride
+        return entity_id
 
-    def update(self):
-        self.Pump()
+    def add_projectile(self, x, y, velocity, owner, hostile):
+        self.projectiles.add(self.new_entity_id(), x, y, velocity, owner, hostile)
 
-        if not self.players:
+    def add_laser_beam(self, laser_beam):
+        laser_beam.id = self.new_entity_id()
+        self.laser_beams.append(laser_beam)
+
+    def update(self, dt):
+        self.Pump()
+        self.simulate(dt)
+        self.send_snapshot()
+
+    def apply_inputs(self, dt):
+        for channel in self.players:
+            channel.input_budget = min(channel.input_budget + dt, MAX_INPUT_BUDGET)
+            inputs = channel.drain_inputs()
+            if not inputs:
+                continue
+
+            # Consecutive inputs holding the same keys move in a straight line,
+            # so each run is applied in one step
+            runs = []
+            for data in inputs:
+                if runs and runs[-1][0] == data["keys"]:
+                    runs[-1][1] += data["dt"]
+                else:
+                    runs.append([data["keys"], data["dt"]])
+
+            player = channel.player
+            for keys, ms in runs:
+                step = min(ms / 1000, channel.input_budget)
+                channel.input_budget -= step
+                player.x, player.y = apply_input(
+                    player.x, player.y, keys, player.speed, step
+                )
+            channel.processed_input = inputs[-1]["seq"]
+            self.inputs_applied += len(runs)
+            self.inputs_coalesced += len(inputs) - len(runs)
+
+    def simulate(self, dt):
+        profiler = self.profiler
+        profiler.begin("tick")
+        self.time += dt
+        self.apply_inputs(dt)
+        profiler.mark("inputs")
+        targets = self.enemy_targets()
+        if not len(targets):
+            profiler.end()
             return
 
-        nearest_player = min(
-            self.players, key=lambda p: self.distance(p.player, self.enemy)
+        player_positions = np.array(
+            [(player.player.x, player.player.y) for player in self.players]
+        ).reshape(-1, 2)
+        player_sizes = np.array([player.player.size for player in self.players])
+
+        # Enemies stay around the first target and projectiles near it
+        anchor = tuple(targets[0])
+        targets = targets[self.enemies.nearest(targets)]
+        self.enemies.move(dt, targets)
+
+        shooters, origins, velocities = self.enemies.fire(
+            targets, ENEMY_FIRE_CHANCE, PROJECTILE_SPEED
         )
-        self.enemy.move(
-            self.frame_time, (nearest_player.player.x, nearest_player.player.y)
+        self.projectiles.add_many(
+            [self.new_entity_id() for _ in range(len(shooters))],
+            origins,
+            velocities,
+            self.enemies.ids[shooters],
+            True,
         )
-
-        if random.random() < 0.01:  # Adjust the probability of shooting
-            angle = math.atan2(
-                nearest_player.player.y - self.enemy.y,
-                nearest_player.player.x - self.enemy.x,
-            )
-            velocity = [math.cos(angle) * 400, math.sin(angle) * 400]
-            projectile = Projectile(
-                self.enemy.x + self.enemy.size // 2,
-                self.enemy.y + self.enemy.size // 2,
-                5,
-                RED,
-                400,
-                velocity,
-                "enemy",
+        profiler.mark("enemies")
+
+        self.projectiles.move(dt)
+        profiler.mark("projectile_move")
+
+        player_grid = SpatialHash()
+        for i, player in enumerate(self.players):
+            player_grid.insert(
+                i,
+                player.player.x,
+                player.player.y,
+                player.player.x + player.player.size,
+                player.player.y + player.player.size,
             )
-            self.projectiles.append(projectile)
-
-        for projectile in self.projectiles:
-            projectile.move(self.frame_time)
-
-            if projectile.owner == "enemy":
-                for player in self.players:
-                    if (
-                        player.player.x
-                        < projectile.x
-                        < player.player.x + player.player.size
-                        and player.player.y
-                        < projectile.y
-                        < player.player.y + player.player.size
-                    ):
-                        player.player.health -= PROJECTILE_DAMAGE
-                        self.projectiles.remove(projectile)
-                        break
-            elif self.enemy.color != RED:
-                if (
-                    self.enemy.x < projectile.x < self.enemy.x + self.enemy.size
-                    and self.enemy.y < projectile.y < self.enemy.y + self.enemy.size
-                ):
-                    self.enemy.hit_projectile()
-                    self.projectiles.remove(projectile)
-
-                    if self.enemy.health <= 0:
-                        self.players[0].player.money.gain(100)
-                        self.enemy.respawn(
-                            (self.players[0].player.x, self.players[0].player.y)
-                        )
-                        self.enemy.health = 100
-
-        for laser_beam in self.laser_beams:
-            laser_beam.move()
-
-            if laser_beam.check_collision((self.enemy.x, self.enemy.y)):
-                self.enemy.hit_laser()
 
-                if self.enemy.health <= 0:
-                    self.players[0].player.money.gain(100)
-                    self.enemy.respawn(
-                        (self.players[0].player.x, self.players[0].player.y)
-                    )
-                    self.enemy.health = 100
+        # Red (recently hit) enemies ignore projectiles but not lasers
+        enemy_grid = SpatialHash()
+        hittable_grid = SpatialHash()
+        enemy_positions = self.enemies.positions[: len(self.enemies)]
+        for i, ((x, y), hittable) in enumerate(
+            zip(enemy_positions.tolist(), self.enemies.hittable().tolist())
+        ):
+            box = (x, y, x + self.enemies.size, y + self.enemies.size)
+            enemy_grid.insert(i, *box)
+            if hittable:
+                hittable_grid.insert(i, *box)
+        profiler.mark("grids")
+
+        hit, player_indices = self.projectiles.hits(
+            player_grid, player_positions, player_sizes, True
+        )
+        self.projectiles.kill(hit)
+        for i in player_indices.tolist():
+            self.players[i].player.damage(PROJECTILE_DAMAGE)
+
+        hit, enemy_indices = self.projectiles.hits(
+            hittable_grid,
+            enemy_positions,
+            np.full(len(self.enemies), self.enemies.size),
+            False,
+        )
+        # An enemy turns red on its first hit and lets the rest pass through
+        enemy_indices, first = np.unique(enemy_indices, return_index=True)
+        self.projectiles.kill(hit[first])
+        self.enemies.hit(enemy_indices, PROJECTILE_DAMAGE)
+        profiler.mark("projectile_hits")
 
-            if laser_beam.is_faded():
-                self.laser_beams.remove(laser_beam)
+        for laser_beam in self.laser_beams:
+            laser_beam.move(dt)
+
+            hit = [
+                i
+                for i in enemy_grid.query_segment(
+                    laser_beam.start_point, laser_beam.end_point, ENEMY_SIZE
+                )
+                if laser_beam.check_collision(enemy_positions[i])
+            ]
+            self.enemies.hit(hit, LASER_DAMAGE)
+
+        self.laser_beams = [
+            laser_beam for laser_beam in self.laser_beams if not laser_beam.is_faded()
+        ]
+        profiler.mark("lasers")
+
+        dead = self.enemies.dead()
+        if len(dead):
+            if self.players:
+                self.players[0].player.money.gain(100 * len(dead))
+            self.enemies.respawn(dead, anchor)
+
+        self.enemies.update()
+
+        self.projectiles.kill_outside(anchor, 1000)
+        self.projectiles.compact()
+        profiler.mark("cleanup")
+
+        profiler.count("players", len(self.players))
+        profiler.count("enemies", len(self.enemies))
+        profiler.count("projectiles", len(self.projectiles))
+        profiler.count("laser_beams", len(self.laser_beams))
+        profiler.end()
+
+    def enemy_targets(self):
+        # Positions the enemies chase and fire at
+        return np.array(
+            [(player.player.x, player.player.y) for player in self.players]
+        ).reshape(-1, 2)
+
+    def send_snapshot(self):
+        profiler = self.profiler
+        profiler.begin("snapshot")
+        self.send_chat()
+        profiler.mark("chat")
+        if not self.players:
+            profiler.end()
+            return
 
-        self.enemy.update(self.frame_time)
+        game_state = self.game_state()
+        profiler.mark("build")
 
-        self.projectiles = [
-            p
-            for p in self.projectiles
-            if abs(p.x - self.players[0].player.x) <= 1000
-            and abs(p.y - self.players[0].player.y) <= 1000
-        ]
+        profiler.count("encoded_bytes", self.send_to_all(game_state))
+        profiler.mark("send")
+        profiler.end()
 
-        game_state = {
-            "players": [
-                {
+    def game_state(self):
+        return {
+            "players": {
+                player.id: {
                     "x": player.player.x,
                     "y": player.player.y,
                     "money": player.player.money.amount,
                     "has_laser_beam": player.player.has_laser_beam,
                     "name": player.player.name,
                     "health": player.player.health,
+                    "input_seq": player.processed_input,
                 }
                 for player in self.players
-            ],
-            "enemy": {
-                "x": self.enemy.x,
-                "y": self.enemy.y,
-                "color": self.enemy.color,
-                "health": self.enemy.health,
             },
-            "projectiles": [
-                {"x": projectile.x, "y": projectile.y, "name": projectile.owner}
-                for projectile in self.projectiles
-            ],
-            "laser_beams": [
-                {
+            "enemies": {
+                entity_id: {
+                    "x": x,
+                    "y": y,
+                    "color": RED if hit_timer else GREEN,
+                    "health": health,
+                }
+                for entity_id, (x, y), hit_timer, health in self.enemies.records()
+            },
+            "projectiles": {
+                entity_id: {"x": x, "y": y, "owner": owner}
+                for entity_id, (x, y), owner in self.projectiles.records()
+            },
+            "laser_beams": {
+                laser_beam.id: {
                     "start_point": laser_beam.start_point,
                     "angle": laser_beam.angle,
+                    "owner": laser_beam.owner,
                 }
                 for laser_beam in self.laser_beams
-            ],
+            },
         }
 
-        self.send_to_all(game_state)
+    def broadcast(self, data, channels=None):
+        # Serialize once per wire format and share the frame between every
+        # channel's send queue
+        if channels is None:
+            channels = self.players
+
+        frames = {}
+        for channel in channels:
+            outgoing = frames.get(channel.protocol)
+            if outgoing is None:
+                outgoing = encode_message(data, channel.protocol)
+                frames[channel.protocol] = outgoing
+            channel.SendFrame(outgoing, data["action"])
+
+        self.encodes += len(frames)
+        self.encodes_saved += len(channels) - len(frames)
+        return sum(len(outgoing) for outgoing in frames.values())
+
+    def entity_bounds(self, game_state):
+        # Boxes come from the snapshot rather than the live entities, so a
+        # server can send a world it does not simulate itself
+        bounds = {
+            "players": {
+                entity_id: (
+                    record["x"],
+                    record["y"],
+                    record["x"] + PLAYER_SIZE,
+                    record["y"] + PLAYER_SIZE,
+                )
+                for entity_id, record in game_state["players"].items()
+            },
+            "enemies": {
+                entity_id: (
+                    record["x"],
+                    record["y"],
+                    record["x"] + ENEMY_SIZE,
+                    record["y"] + ENEMY_SIZE,
+                )
+                for entity_id, record in game_state["enemies"].items()
+            },
+            "projectiles": {
+                entity_id: (record["x"], record["y"], record["x"], record["y"])
+                for entity_id, record in game_state["projectiles"].items()
+            },
+            "laser_beams": {},
+        }
+        for entity_id, record in game_state["laser_beams"].items():
+            x1, y1 = record["start_point"]
+            x2 = x1 + math.cos(record["angle"]) * LASER_LENGTH
+            y2 = y1 + math.sin(record["angle"]) * LASER_LENGTH
+            bounds["laser_beams"][entity_id] = (
+                min(x1, x2),
+                min(y1, y2),
+                max(x1, x2),
+                max(y1, y2),
+            )
 
-    def send_to_all(self, data):
+        grid = SpatialHash()
+        for section, section_bounds in bounds.items():
+            for entity_id, box in section_bounds.items():
+                grid.insert((section, entity_id), *box)
+        return bounds, grid
+
+    def interest_view(self, channel, bounds, grid):
+        center_x = channel.player.x + channel.player.size / 2
+        center_y = channel.player.y + channel.player.size / 2
+        left = center_x - self.interest_radius
+        right = center_x + self.interest_radius
+        top = center_y - self.interest_radius
+        bottom = center_y + self.interest_radius
+
+        visible = {section: [] for section in bounds}
+        for section, entity_id in grid.query(left, top, right, bottom):
+            x0, y0, x1, y1 = bounds[section][entity_id]
+            if x1 >= left and x0 <= right and y1 >= top and y0 <= bottom:
+                visible[section].append(entity_id)
+        return tuple((section, frozenset(ids)) for section, ids in visible.items())
+
+    def send_to_all(self, game_state):
+        self.seq += 1
+        bounds, grid = self.entity_bounds(game_state)
+
+        # Channels with the same acked baseline, seen through the same view then
+        # and now, get identical deltas, so they still share one encoded frame
+        encoded = 0
+        groups = {}
         for player in self.players:
-            player.Send({"action": "game_state", "data": data})
+            view = self.interest_view(player, bounds, grid)
+            snapshot = filter_snapshot(game_state, view)
+            player.snapshots.add(self.seq, (snapshot, view, self.id_mark()))
+            base_seq = player.acked_seq
+            base = player.snapshots.get(base_seq)
+            if base is None:
+                base_seq = None
+                base_view = ()
+            else:
+                base_view = base[1]
+            groups.setdefault((base_seq, base_view, view), []).append(player)
+
+        for (base_seq, _, view), channels in groups.items():
+            snapshot = channels[0].snapshots.get(self.seq)[0]
+            if base_seq is None:
+                base, base_view, base_mark = {}, (), None
+            else:
+                base, base_view, base_mark = channels[0].snapshots.get(base_seq)
+            changed, removed = diff_snapshots(base, snapshot)
+
+            # Entities crossing the interest boundary, as opposed to ones that
+            # were spawned or destroyed since the baseline
+            base_ids = dict(base_view)
+            entered = {}
+            left = {}
+            for section, ids in view:
+                old_ids = base_ids.get(section, frozenset())
+                came = [i for i in ids - old_ids if self.existed(i, base_mark)]
+                if came:
+                    entered[section] = came
+                went = [i for i in old_ids - ids if i in game_state[section]]
+                if went:
+                    left[section] = went
+
+            encoded += self.broadcast(
+                {
+                    "action": "game_state",
+                    "data": {
+                        "seq": self.seq,
+                        "base": base_seq,
+                        "time": round(self.time * 1000),
+                        "changed": changed,
+                        "removed": removed,
+                        "entered": entered,
+                        "left": left,
+                    },
+                },
+                channels,
+            )
+        return encoded
 
-    def broadcast_chat(self, message, sender):
-        for player in self.players:
-            if player.player.name != sender:
-                player.Send({"action": "chat", "message": message, "sender": sender})
+    def id_mark(self):
+        # Taken with every snapshot to tell entities that were spawned since
+        # then from ones that were already there
+        return self.next_id
+
+    def existed(self, entity_id, mark):
+        return mark is not None and entity_id < mark
+
+    def send_chat(self):
+        # Everything said since the last snapshot goes out as one message that
+        # every channel shares; clients skip their own lines
+        messages = self.chat.flush()
+        if messages and self.players:
+            self.broadcast({"action": "chat", "messages": messages})
 
 
 class GameObject:
@@ -216,13 +643,7 @@ class GameObject:
         self.size = size
         self.color = color
         self.speed = speed
-
-    def draw(self, screen, offset_x, offset_y):
-        pygame.draw.rect(
-            screen,
-            self.color,
-            (int(self.x - offset_x), int(self.y - offset_y), self.size, self.size),
-        )
+        self.id = None
 
 
 class Player(GameObject):
@@ -233,72 +654,9 @@ class Player(GameObject):
         self.money = money
         self.health = health
 
-
-class Enemy(GameObject):
-    def __init__(self, x, y, size, color, speed, minimap_radius, health=100):
-        super().__init__(x, y, size, color, speed)
-        self.hit_timer = 0
-        self.minimap_radius = minimap_radius
-        self.health = health
-
-    def move(self, dt, player_pos):
-        if self.x < player_pos[0]:
-            self.x += self.speed * dt
-        if self.x > player_pos[0]:
-            self.x -= self.speed * dt
-        if self.y < player_pos[1]:
-            self.y += self.speed * dt
-        if self.y > player_pos[1]:
-            self.y -= self.speed * dt
-
-    def hit_projectile(self):
-        self.health -= PROJECTILE_DAMAGE
-        self.hit_timer = 30
-        self.color = RED
-
-    def hit_laser(self):
-        self.health -= LASER_DAMAGE
-        self.hit_timer = 30
-        self.color = RED
-
-    def respawn(self, player_pos):
-        minimap_left = player_pos[0] - self.minimap_radius
-        minimap_right = player_pos[0] + self.minimap_radius
-        minimap_top = player_pos[1] - self.minimap_radius
-        minimap_bottom = player_pos[1] + self.minimap_radius
-
-        while True:
-            self.x = player_pos[0] + random.randint(-1000, 1000)
-            self.y = player_pos[1] + random.randint(-1000, 1000)
-
-            if (
-                self.x < minimap_left
-                or self.x > minimap_right
-                or self.y < minimap_top
-                or self.y > minimap_bottom
-            ):
-                break
-
-        self.color = GREEN
-        self.hit_count = 0
-        self.hit_timer = 0
-
-    def update(self, dt):
-        if self.hit_timer > 0:
-            self.hit_timer -= 1
-            if self.hit_timer == 0:
-                self.color = GREEN
-
-
-class Projectile(GameObject):
-    def __init__(self, x, y, size, color, speed, velocity, owner):
-        super().__init__(x, y, size, color, speed)
-        self.velocity = velocity
-        self.owner = owner
-
-    def move(self, dt):
-        self.x += self.velocity[0] * dt
-        self.y += self.velocity[1] * dt
+    def damage(self, amount):
+        # Health bottoms out at zero, where the client gives up the game
+        self.health = max(0, self.health - amount)
 
 
 class Money:
@@ -313,15 +671,19 @@ class LaserBeam(GameObject):
     def __init__(self, x, y, size, color, speed, angle, fade_duration):
         super().__init__(x, y, size, color, speed)
         self.angle = angle
+        self.owner = 0
         self.fade_duration = fade_duration * 1000
         self.fade_timer = 0
-        self.spawn_time = pygame.time.get_ticks()
         self.start_point = (x, y)
-        self.end_point = (x + math.cos(angle) * 1000, y + math.sin(angle) * 1000)
+        self.end_point = (
+            x + math.cos(angle) * LASER_LENGTH,
+            y + math.sin(angle) * LASER_LENGTH,
+        )
 
-    def move(self):
-        current_time = pygame.time.get_ticks()
-        self.fade_timer = current_time - self.spawn_time
+    def move(self, dt):
+        # Fades in simulation time, so a beam lasts the same number of ticks
+        # however late the server runs
+        self.fade_timer += dt * 1000
 
     def is_faded(self):
         return self.fade_timer > self.fade_duration
@@ -345,12 +707,84 @@ class LaserBeam(GameObject):
         return False
 
 
-def main():
-    server = GameServer(localaddr=("0.0.0.0", 12345))
+def build_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE)
+    parser.add_argument("--snapshot-rate", type=float, default=SNAPSHOT_RATE)
+    parser.add_argument("--pump-rate", type=float, default=PUMP_RATE)
+    parser.add_argument("--max-catchup-ticks", type=int, default=MAX_CATCHUP_TICKS)
+    parser.add_argument("--interest-radius", type=float, default=INTEREST_RADIUS)
+    parser.add_argument("--enemies", type=int, default=ENEMY_COUNT)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time every tick phase from the start; SIGUSR1 toggles it at runtime",
+    )
+    parser.add_argument(
+        "--traffic-report",
+        type=float,
+        default=0,
+        help="print bandwidth by message type and channel every this many seconds",
+    )
+    return parser
+
+
+def serve(server, args):
+    server.profiler.enabled = args.profile
+
+    def toggle_profiler(signum, frame):
+        if not server.profiler.toggle():
+            print(server.profiler.report())
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle_profiler)
+
+    scheduler = FixedStepScheduler(
+        tick_rate=args.tick_rate,
+        snapshot_rate=args.snapshot_rate,
+        pump_rate=args.pump_rate,
+        max_catchup_ticks=args.max_catchup_ticks,
+    )
+
+    try:
+        scheduler.run(server.simulate, server.send_snapshot, server.Pump)
+    except KeyboardInterrupt:
+        print(f"Encodes: {server.encodes}, encodes saved: {server.encodes_saved}")
+        print(
+            f"Inputs applied: {server.inputs_applied}, "
+            f"inputs coalesced: {server.inputs_coalesced}"
+        )
+        print(
+            f"Chat messages: {server.chat.accepted}, "
+            f"rate limited: {server.chat.dropped}"
+        )
+        print(
+            f"Ticks: {scheduler.ticks}, snapshots: {scheduler.snapshots}, "
+            f"pumps: {scheduler.pumps}, dropped ticks: {scheduler.dropped_ticks}"
+        )
+        traffic = server.traffic
+        print(
+            f"Traffic out: {traffic.bytes(traffic.totals, SENT) / 1024:.1f} KB, "
+            f"in: {traffic.bytes(traffic.totals, RECEIVED) / 1024:.1f} KB"
+        )
+        if server.profiler.enabled:
+            print(server.profiler.report())
 
-    while True:
-        server.frame_time = server.clock.tick(60) / 1000.0
-        server.update()
+
+def main():
+    args = build_parser("Run the game server").parse_args()
+    server = GameServer(
+        localaddr=(args.host, args.port),
+        transport=args.transport,
+        interest_radius=args.interest_radius,
+        enemy_count=args.enemies,
+        tick_budget=1 / args.tick_rate,
+        traffic_interval=args.traffic_report,
+    )
+    serve(server, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+import bisect
+import math
+import random
+import signal
+
+import numpy as np
+
+from server import (
+    ENEMY_SIZE,
+    PLAYER_SIZE,
+    PROJECTILE_DAMAGE,
+    RED,
+    GameServer,
+    Money,
+    Player,
+)
+from spatial import SpatialHash
+
+# The map is cut into vertical strips this wide, centred on the origin; the
+# outermost strips run on to infinity
+REGION_WIDTH = 2000
+
+# Players and enemies this close to a strip's edge are copied to the shard on
+# the other side as ghosts, so its projectiles can still hit them. It has to
+# cover an entity's size plus a tick of projectile movement.
+GHOST_MARGIN = 200
+
+# Half the height of the band the enemies spawn in
+SPAWN_RANGE = 400
+
+
+def region_boundaries(shards, width=REGION_WIDTH):
+    return [(i - shards / 2) * width for i in range(1, shards)]
+
+
+def shard_for(x, boundaries):
+    return bisect.bisect_right(boundaries, x)
+
+
+def player_state(channel):
+    # Everything a shard needs to take a player over, from a ClientChannel or
+    # a ShardPlayer
+    player = channel.player
+    return {
+        "id": channel.id,
+        "x": player.x,
+        "y": player.y,
+        "health": player.health,
+        "money": player.money.amount,
+        "has_laser_beam": player.has_laser_beam,
+        "input_budget": channel.input_budget,
+        "processed_input": channel.processed_input,
+    }
+
+
+def new_departures():
+    return {"players": [], "enemies": [], "projectiles": []}
+
+
+class ShardPlayer:
+    # Stands in for a player's ClientChannel inside a shard; the gateway
+    # forwards the client's inputs and mirrors the player back each tick
+    def __init__(self, state):
+        self.id = state["id"]
+        self.player = Player(state["x"], state["y"], PLAYER_SIZE, RED, 300, "", Money())
+        self.player.health = state["health"]
+        self.player.money.amount = state["money"]
+        self.player.has_laser_beam = state["has_laser_beam"]
+        self.input_budget = state["input_budget"]
+        self.processed_input = state["processed_input"]
+        self.inputs = []
+
+    def drain_inputs(self):
+        inputs = self.inputs
+        self.inputs = []
+        return inputs
+
+
+class WorldShard(GameServer):
+    # Simulates the strip left <= x < right of the map with the server's own
+    # tick. Afterwards everything that left the strip is handed to the gateway
+    # for the shard now holding it, and the players and enemies near the edges
+    # are reported as ghosts for the neighbours.
+    def __init__(self, index, boundaries, enemy_count, width=REGION_WIDTH):
+        GameServer.__init__(
+            self,
+            transport="local",
+            enemy_count=0,
+            id_offset=index + 1,
+            id_stride=len(boundaries) + 2,
+        )
+        self.index = index
+        self.boundaries = boundaries
+        self.left = boundaries[index - 1] if index > 0 else -math.inf
+        self.right = boundaries[index] if index < len(boundaries) else math.inf
+        self.ghost_players = []
+        self.ghost_enemies = []
+
+        # Enemies start spread over a band as wide as all the strips together
+        extent = max(SPAWN_RANGE, (len(boundaries) + 1) * width / 2)
+        low = max(self.left, -extent)
+        high = min(self.right, extent) - 1
+        for _ in range(enemy_count):
+            self.enemies.spawn(
+                self.new_entity_id(),
+                random.uniform(low, high),
+                random.uniform(-SPAWN_RANGE, SPAWN_RANGE),
+            )
+
+    def enemy_targets(self):
+        # Players just across an edge are chased and shot at like local ones
+        ghosts = np.array([(x, y) for _, x, y in self.ghost_players]).reshape(-1, 2)
+        return np.concatenate((GameServer.enemy_targets(self), ghosts))
+
+    def simulate(self, dt):
+        GameServer.simulate(self, dt)
+        if not len(self.enemy_targets()):
+            # With nobody here or nearby the base tick stops short, but damage
+            # from across the edges still lands, so enemies keep recovering
+            # and dying. Nothing is left for projectiles to hit, and lasers
+            # still have to fade.
+            for i in self.enemies.dead().tolist():
+                self.enemies.respawn([i], self.enemies.positions[i].copy())
+            self.enemies.update()
+            self.projectiles.kill(np.arange(len(self.projectiles)))
+            self.projectiles.compact()
+            for laser_beam in self.laser_beams:
+                laser_beam.move(dt)
+            self.laser_beams = [
+                laser_beam
+                for laser_beam in self.laser_beams
+                if not laser_beam.is_faded()
+            ]
+
+    def tick(self, dt, joins, leaves, inputs, projectiles, laser_beams):
+        for state in joins:
+            self.players.append(ShardPlayer(state))
+        if leaves:
+            self.players = [
+                player for player in self.players if player.id not in leaves
+            ]
+        players = {player.id: player for player in self.players}
+        for player_id, player_inputs in inputs.items():
+            if player_id in players:
+                players[player_id].inputs.extend(player_inputs)
+        for projectile in projectiles:
+            self.projectiles.add(*projectile)
+        self.laser_beams.extend(laser_beams)
+
+        self.simulate(dt)
+        damage = self.border_hits()
+        return {
+            "players": {player.id: player_state(player) for player in self.players},
+            "departures": self.departures(),
+            "ghosts": self.ghosts(),
+            "damage": damage,
+            "inputs": (self.inputs_applied, self.inputs_coalesced),
+        }
+
+    def border_hits(self):
+        # Projectiles against the neighbours' players and enemies near the
+        # edges; the damage is dealt by the shards that own them
+        damage = []
+        for section, ghosts, size, hostile in (
+            ("players", self.ghost_players, PLAYER_SIZE, True),
+            ("enemies", self.ghost_enemies, ENEMY_SIZE, False),
+        ):
+            if not ghosts or not len(self.projectiles):
+                continue
+            grid = SpatialHash()
+            for i, (_, x, y) in enumerate(ghosts):
+                grid.insert(i, x, y, x + size, y + size)
+            positions = np.array([(x, y) for _, x, y in ghosts])
+            hit, indices = self.projectiles.hits(
+                grid, positions, np.full(len(ghosts), size), hostile
+            )
+            if section == "enemies":
+                indices, first = np.unique(indices, return_index=True)
+                hit = hit[first]
+            self.projectiles.kill(hit)
+            damage.extend(
+                (section, ghosts[i][0], PROJECTILE_DAMAGE) for i in indices.tolist()
+            )
+        self.projectiles.compact()
+        return damage
+
+    def outside(self, xs):
+        return np.flatnonzero((xs < self.left) | (xs >= self.right))
+
+    def departures(self):
+        # {shard index: {section: [...]}} for everything that left the strip
+        departures = {}
+        staying = []
+        for player in self.players:
+            if self.left <= player.player.x < self.right:
+                staying.append(player)
+                continue
+            destination = shard_for(player.player.x, self.boundaries)
+            departures.setdefault(destination, new_departures())["players"].append(
+                player_state(player)
+            )
+        self.players = staying
+
+        enemies = self.enemies
+        leaving = self.outside(enemies.positions[: len(enemies), 0])
+        for i in leaving.tolist():
+            x, y = enemies.positions[i].tolist()
+            departures.setdefault(shard_for(x, self.boundaries), new_departures())[
+                "enemies"
+            ].append(
+                (
+                    int(enemies.ids[i]),
+                    x,
+                    y,
+                    int(enemies.health[i]),
+                    int(enemies.hit_timers[i]),
+                )
+            )
+        enemies.remove(leaving)
+
+        pool = self.projectiles
+        leaving = self.outside(pool.positions[: len(pool), 0])
+        for i in leaving.tolist():
+            x, y = pool.positions[i].tolist()
+            departures.setdefault(shard_for(x, self.boundaries), new_departures())[
+                "projectiles"
+            ].append(
+                (
+                    int(pool.ids[i]),
+                    x,
+                    y,
+                    pool.velocities[i].tolist(),
+                    int(pool.owners[i]),
+                    bool(pool.hostile[i]),
+                )
+            )
+        pool.kill(leaving)
+        pool.compact()
+        return departures
+
+    def ghosts(self):
+        # {neighbour index: (players, enemies)} near the edge shared with it,
+        # as (id, x, y); enemies only while projectiles can hit them
+        players = [
+            (player.id, player.player.x, player.player.y) for player in self.players
+        ]
+        enemies = [
+            (entity_id, x, y)
+            for (entity_id, (x, y), _, _), hittable in zip(
+                self.enemies.records(), self.enemies.hittable().tolist()
+            )
+            if hittable
+        ]
+        ghosts = {}
+        for neighbour, near in (
+            (self.index - 1, lambda x: x < self.left + GHOST_MARGIN),
+            (self.index + 1, lambda x: x >= self.right - GHOST_MARGIN),
+        ):
+            if 0 <= neighbour <= len(self.boundaries):
+                ghosts[neighbour] = (
+                    [ghost for ghost in players if near(ghost[1])],
+                    [ghost for ghost in enemies if near(ghost[1])],
+                )
+        return ghosts
+
+    def exchange(self, arrivals, ghost_players, ghost_enemies, damage):
+        for state in arrivals["players"]:
+            self.players.append(ShardPlayer(state))
+        for entity_id, x, y, health, hit_timer in arrivals["enemies"]:
+            self.enemies.spawn(entity_id, x, y, health, hit_timer)
+        for projectile in arrivals["projectiles"]:
+            self.projectiles.add(*projectile)
+        self.ghost_players = ghost_players
+        self.ghost_enemies = ghost_enemies
+
+        players = {player.id: player for player in self.players}
+        enemies = {
+            entity_id: i
+            for i, entity_id in enumerate(
+                self.enemies.ids[: len(self.enemies)].tolist()
+            )
+        }
+        for section, entity_id, amount in damage:
+            if section == "players" and entity_id in players:
+                players[entity_id].player.damage(amount)
+            elif section == "enemies" and entity_id in enemies:
+                self.enemies.hit([enemies[entity_id]], amount)
+
+    def state(self):
+        game_state = self.game_state()
+        return {
+            "enemies": game_state["enemies"],
+            "projectiles": game_state["projectiles"],
+            "id_mark": self.next_id,
+        }
+
+
+def run_shard(connection, index, boundaries, enemy_count, width):
+    # Body of a shard's worker process; it answers the gateway until told to
+    # stop, and Ctrl-C is left to the gateway
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed()
+    shard = WorldShard(index, boundaries, enemy_count, width)
+    while True:
+        message = connection.recv()
+        action = message[0]
+        if action == "tick":
+            connection.send(shard.tick(*message[1:]))
+        elif action == "exchange":
+            shard.exchange(*message[1:])
+        elif action == "state":
+            connection.send(shard.state())
+        elif action == "stop":
+            break
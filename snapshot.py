@@ -0,0 +1,84 @@
+# Snapshots are {section: {entity_id: {field: value}}} dicts. The server keeps the
+# ones it sent and diffs the current world against the newest snapshot a client
+# has acknowledged, so only changed fields travel over the wire. A view is a
+# hashable tuple of (section, frozenset(entity_ids)) pairs describing what a
+# client is allowed to see.
+
+SNAPSHOT_HISTORY = 64
+
+
+def diff_snapshots(base, current):
+    changed = {}
+    removed = {}
+
+    for section, records in current.items():
+        base_records = base.get(section, {})
+        section_changes = {}
+        for entity_id, record in records.items():
+            base_record = base_records.get(entity_id)
+            if base_record is None:
+                section_changes[entity_id] = record
+                continue
+            fields = {
+                key: value
+                for key, value in record.items()
+                if base_record.get(key) != value
+            }
+            if fields:
+                section_changes[entity_id] = fields
+        if section_changes:
+            changed[section] = section_changes
+
+    for section, base_records in base.items():
+        records = current.get(section, {})
+        gone = [entity_id for entity_id in base_records if entity_id not in records]
+        if gone:
+            removed[section] = gone
+
+    return changed, removed
+
+
+def apply_delta(base, changed, removed, sections=()):
+    snapshot = {section: dict(records) for section, records in base.items()}
+    for section in sections:
+        snapshot.setdefault(section, {})
+
+    for section, records in changed.items():
+        section_records = snapshot.setdefault(section, {})
+        for entity_id, fields in records.items():
+            record = section_records.get(entity_id)
+            if record is None:
+                section_records[entity_id] = dict(fields)
+            else:
+                record = dict(record)
+                record.update(fields)
+                section_records[entity_id] = record
+
+    for section, entity_ids in removed.items():
+        section_records = snapshot.get(section, {})
+        for entity_id in entity_ids:
+            section_records.pop(entity_id, None)
+
+    return snapshot
+
+
+def filter_snapshot(snapshot, view):
+    return {
+        section: {entity_id: snapshot[section][entity_id] for entity_id in ids}
+        for section, ids in view
+    }
+
+
+class SnapshotHistory:
+    def __init__(self, size=SNAPSHOT_HISTORY):
+        self.size = size
+        self.snapshots = {}
+
+    def add(self, seq, snapshot):
+        self.snapshots[seq] = snapshot
+        self.snapshots.pop(seq - self.size, None)
+
+    def get(self, seq):
+        if seq is None:
+            return None
+        return self.snapshots.get(seq)
@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+
+CELL_SIZE = 200
+
+# Cells are keyed by a single integer so the same keys can be computed for
+# NumPy point arrays and for Python boxes
+CELL_KEY_STRIDE = 1 << 32
+CELL_KEY_OFFSET = 1 << 31
+
+
+def cell_key(cx, cy):
+    return cx * CELL_KEY_STRIDE + (cy + CELL_KEY_OFFSET)
+
+
+def cell_keys(points, cell_size=CELL_SIZE):
+    cells = np.floor(points / cell_size).astype(np.int64)
+    return cells[:, 0] * CELL_KEY_STRIDE + (cells[:, 1] + CELL_KEY_OFFSET)
+
+
+class SpatialHash:
+    # Uniform grid broadphase: every item is listed in each cell its bounding box
+    # touches, so a query only has to look at the cells overlapping its own box.
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return (
+            range(math.floor(x0 / size), math.floor(x1 / size) + 1),
+            range(math.floor(y0 / size), math.floor(y1 / size) + 1),
+        )
+
+    def insert(self, item, x0, y0, x1, y1):
+        xs, ys = self.cell_range(x0, y0, x1, y1)
+        for cx in xs:
+            for cy in ys:
+                key = cell_key(cx, cy)
+                items = self.cells.get(key)
+                if items is None:
+                    self.cells[key] = [item]
+                else:
+                    items.append(item)
+
+    def query(self, x0, y0, x1, y1):
+        found = set()
+        xs, ys = self.cell_range(x0, y0, x1, y1)
+        for cx in xs:
+            for cy in ys:
+                items = self.cells.get(cell_key(cx, cy))
+                if items:
+                    found.update(items)
+        return found
+
+    def query_segment(self, start, end, radius):
+        # Cells along the segment, widened by radius
+        x0 = min(start[0], end[0]) - radius
+        y0 = min(start[1], end[1]) - radius
+        x1 = max(start[0], end[0]) + radius
+        y1 = max(start[1], end[1]) + radius
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if length <= self.cell_size:
+            return self.query(x0, y0, x1, y1)
+
+        # A long diagonal beam's bounding box covers far more cells than the
+        # beam itself, so walk it one cell length at a time instead
+        found = set()
+        steps = math.ceil(length / self.cell_size)
+        for step in range(steps + 1):
+            t = step / steps
+            x = start[0] + (end[0] - start[0]) * t
+            y = start[1] + (end[1] - start[1]) * t
+            reach = radius + self.cell_size / 2
+            found.update(self.query(x - reach, y - reach, x + reach, y + reach))
+        return found
@@ -0,0 +1,77 @@
+SENT = "out"
+RECEIVED = "in"
+
+# Channels listed in a report, heaviest senders first
+TRAFFIC_TOP_CHANNELS = 10
+
+
+class TrafficStats:
+    # Messages and bytes in each direction by action name, both since the
+    # start and since the last report, plus a gauge of the bytes waiting in
+    # the send buffer and its peak since the last report. Sizes are whole
+    # frames as handed to the transport, without TCP/IP or UDP overhead.
+    def __init__(self):
+        self.totals = {}
+        self.window = {}
+        self.backlog = 0
+        self.peak_backlog = 0
+
+    def count(self, direction, action, size):
+        for series in (self.totals, self.window):
+            counts = series.get((direction, action))
+            if counts is None:
+                counts = [0, 0]
+                series[(direction, action)] = counts
+            counts[0] += 1
+            counts[1] += size
+
+    def gauge(self, backlog):
+        self.backlog = backlog
+        self.peak_backlog = max(self.peak_backlog, backlog)
+
+    def bytes(self, series, direction):
+        return sum(size for (d, _), (_, size) in series.items() if d == direction)
+
+    def reset_window(self):
+        self.window = {}
+        self.peak_backlog = self.backlog
+
+
+def traffic_report(stats, channels, elapsed):
+    # Rates over the last `elapsed` seconds next to the totals, by action and
+    # for the channels sending the most
+    lines = [
+        f"{'dir':<4} {'action':<12} {'msgs/s':>8} {'KB/s':>8} "
+        f"{'msgs':>10} {'KB':>10}"
+    ]
+    for key in sorted(stats.totals):
+        messages, size = stats.window.get(key, (0, 0))
+        total_messages, total_size = stats.totals[key]
+        lines.append(
+            f"{key[0]:<4} {key[1]:<12} {messages / elapsed:>8.1f} "
+            f"{size / elapsed / 1024:>8.1f} {total_messages:>10} "
+            f"{total_size / 1024:>10.1f}"
+        )
+
+    lines.append(
+        f"{'channel':<8} {'name':<16} {'out KB/s':>9} {'in KB/s':>8} "
+        f"{'backlog KB':>10} {'peak KB':>8}"
+    )
+    heaviest = sorted(
+        channels,
+        key=lambda channel: channel.traffic.bytes(channel.traffic.window, SENT),
+        reverse=True,
+    )
+    for channel in heaviest[:TRAFFIC_TOP_CHANNELS]:
+        traffic = channel.traffic
+        lines.append(
+            f"{channel.id:<8} {channel.player.name[:16]:<16} "
+            f"{traffic.bytes(traffic.window, SENT) / elapsed / 1024:>9.1f} "
+            f"{traffic.bytes(traffic.window, RECEIVED) / elapsed / 1024:>8.1f} "
+            f"{traffic.backlog / 1024:>10.1f} {traffic.peak_backlog / 1024:>8.1f}"
+        )
+    lines.append(
+        f"Send backlog: {stats.backlog / 1024:.1f} KB, "
+        f"peak {stats.peak_backlog / 1024:.1f} KB"
+    )
+    return "\n".join(lines)
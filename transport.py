@@ -0,0 +1,454 @@
+import asyncio
+import struct
+import time
+
+from PodSixNet.Channel import Channel
+from PodSixNet.EndPoint import EndPoint
+from PodSixNet.Server import Server
+from PodSixNet.asyncwrapper import poll
+
+from protocol import TERMINATOR, PackedChannelMixin, decode_frame, encode_message
+
+# Snapshots, moves and pings are superseded by the next one, so they go
+# unreliable but sequenced (late datagrams are dropped). Everything else is
+# reliable-ordered.
+UNRELIABLE_ACTIONS = {"game_state", "move", "ack", "ping", "pong"}
+
+DATAGRAM_HEADER = struct.Struct("<BI")
+KIND_UNRELIABLE = 0
+KIND_RELIABLE = 1
+KIND_ACK = 2
+KIND_CONNECT = 3
+KIND_DISCONNECT = 4
+KIND_PING = 5
+KIND_FRAGMENT = 6
+KIND_RELIABLE_PART = 7
+
+# Frames are split so no datagram exceeds this, which stays under common path
+# MTUs. Unreliable fragments carry their index and count and the whole frame
+# is dropped if one is lost; reliable frames are sent as consecutive reliable
+# parts, the last of them KIND_RELIABLE, and joined on delivery.
+MAX_DATAGRAM = 1200
+FRAGMENT_HEADER = struct.Struct("<HH")
+MAX_FRAGMENTS = 4096
+# Unreliable frames being reassembled at once; older ones are given up
+MAX_PARTIAL_FRAMES = 4
+# Reliable datagrams further ahead of the next one expected are dropped, and
+# resent by the peer once the gap has filled
+RELIABLE_WINDOW = 256
+
+# asyncio reads one datagram per selector wakeup, so Pump keeps stepping the
+# loop while datagrams arrive, up to this many steps
+MAX_READ_STEPS = 256
+
+RESEND_INTERVAL = 0.2
+PING_INTERVAL = 1.0
+TIMEOUT = 10.0
+
+
+class TcpChannel(PackedChannelMixin, Channel):
+    def send_backlog(self):
+        # Bytes not yet written to the socket, queued here or in asynchat
+        return sum(len(frame) for frame in self.sendqueue) + sum(
+            len(data) for data in self.producer_fifo
+        )
+
+
+class TcpServer(Server):
+    # PodSixNet's asyncore TCP server, reporting connections to the game.
+    # Channels are created with the game as their server, since PodSixNet
+    # sends through them before calling Connected.
+    def __init__(self, game, localaddr, channel_class):
+        self.game = game
+        self.channel_class = channel_class
+        Server.__init__(self, self.create_channel, localaddr=localaddr)
+
+    def create_channel(self, conn, addr, server, map):
+        return self.channel_class(conn, addr, self.game, map)
+
+    def Connected(self, channel, addr):
+        self.game.Connected(channel, addr)
+
+
+class TcpEndPoint(PackedChannelMixin, EndPoint):
+    def Flush(self):
+        # Pump without polling, for endpoints sharing a socket map
+        Channel.Pump(self)
+        self.queue = []
+
+
+class UdpChannel:
+    # One end of a UDP conversation with an unreliable-sequenced and a
+    # reliable-ordered stream multiplexed by the datagram header. Outgoing
+    # datagrams queue up until Pump, like PodSixNet channels.
+    protocol = 0
+
+    def __init__(self, transport=None, addr=None, server=None):
+        self._transport = transport
+        self.addr = addr
+        self._server = server
+        self.sendqueue = []
+        self.closed = False
+
+        self.unreliable_out = 0
+        self.unreliable_in = 0
+        self.reliable_out = 0
+        self.reliable_in = 0
+        self.unacked = {}
+        self.out_of_order = {}
+        self.ack_pending = False
+        self.fragments = {}
+        self.partial = []
+
+        now = time.monotonic()
+        self.last_heard = now
+        self.last_sent = now
+
+    def Send(self, data):
+        frame = encode_message(data, self.protocol)
+        self.SendFrame(frame, data["action"])
+        return len(frame)
+
+    def SendFrame(self, frame, action):
+        body = frame[: -len(TERMINATOR)]
+        if action in UNRELIABLE_ACTIONS:
+            self.unreliable_out += 1
+            if DATAGRAM_HEADER.size + len(body) <= MAX_DATAGRAM:
+                header = DATAGRAM_HEADER.pack(KIND_UNRELIABLE, self.unreliable_out)
+                self.sendqueue.append(header + body)
+                return
+
+            size = MAX_DATAGRAM - DATAGRAM_HEADER.size - FRAGMENT_HEADER.size
+            chunks = [body[i : i + size] for i in range(0, len(body), size)]
+            if len(chunks) > MAX_FRAGMENTS:
+                print(f"Dropped {action} of {len(body)} bytes to {self.addr}")
+                return
+            header = DATAGRAM_HEADER.pack(KIND_FRAGMENT, self.unreliable_out)
+            for index, chunk in enumerate(chunks):
+                self.sendqueue.append(
+                    header + FRAGMENT_HEADER.pack(index, len(chunks)) + chunk
+                )
+        else:
+            size = MAX_DATAGRAM - DATAGRAM_HEADER.size
+            chunks = [body[i : i + size] for i in range(0, len(body), size)] or [b""]
+            for index, chunk in enumerate(chunks):
+                kind = KIND_RELIABLE if index == len(chunks) - 1 else KIND_RELIABLE_PART
+                self.reliable_out += 1
+                datagram = DATAGRAM_HEADER.pack(kind, self.reliable_out) + chunk
+                self.unacked[self.reliable_out] = [datagram, None]
+                self.sendqueue.append(datagram)
+
+    def send_backlog(self):
+        # Reliable datagrams stay queued for resending until they are acked
+        return sum(len(datagram) for datagram in self.sendqueue) + sum(
+            len(pending[0]) for pending in self.unacked.values()
+        )
+
+    def send_control(self, kind, seq=0):
+        self.sendqueue.append(DATAGRAM_HEADER.pack(kind, seq))
+
+    def Pump(self):
+        if self.closed or self._transport is None:
+            return
+
+        now = time.monotonic()
+        if now - self.last_heard > TIMEOUT:
+            self.close()
+            return
+
+        if self.ack_pending:
+            self.send_control(KIND_ACK, self.reliable_in)
+            self.ack_pending = False
+
+        # pending is [datagram, time last sent]; new ones are already queued
+        for pending in self.unacked.values():
+            if pending[1] is None:
+                pending[1] = now
+            elif now - pending[1] > RESEND_INTERVAL:
+                self.sendqueue.append(pending[0])
+                pending[1] = now
+
+        if not self.sendqueue and now - self.last_sent > PING_INTERVAL:
+            self.send_control(KIND_PING)
+
+        for datagram in self.sendqueue:
+            self._transport.sendto(datagram, self.addr)
+        if self.sendqueue:
+            self.last_sent = now
+        self.sendqueue = []
+
+    def receive(self, datagram):
+        self.last_heard = time.monotonic()
+        kind, seq = DATAGRAM_HEADER.unpack_from(datagram)
+        body = datagram[DATAGRAM_HEADER.size :]
+
+        if kind == KIND_UNRELIABLE:
+            if seq > self.unreliable_in:
+                self.unreliable_in = seq
+                self.dispatch(body)
+        elif kind == KIND_FRAGMENT:
+            self.receive_fragment(seq, body)
+        elif kind in (KIND_RELIABLE, KIND_RELIABLE_PART):
+            self.ack_pending = True
+            if self.reliable_in < seq <= self.reliable_in + RELIABLE_WINDOW:
+                self.out_of_order[seq] = (kind, body)
+            while self.reliable_in + 1 in self.out_of_order:
+                self.reliable_in += 1
+                kind, body = self.out_of_order.pop(self.reliable_in)
+                self.partial.append(body)
+                if kind == KIND_RELIABLE:
+                    body = b"".join(self.partial)
+                    self.partial = []
+                    self.dispatch(body)
+        elif kind == KIND_ACK:
+            for acked in [s for s in self.unacked if s <= seq]:
+                del self.unacked[acked]
+        elif kind == KIND_DISCONNECT:
+            self.close()
+
+    def receive_fragment(self, seq, body):
+        if seq <= self.unreliable_in or len(body) < FRAGMENT_HEADER.size:
+            return
+        index, count = FRAGMENT_HEADER.unpack_from(body)
+        if index >= count or count > MAX_FRAGMENTS:
+            return
+        parts = self.fragments.setdefault(seq, {})
+        parts[index] = body[FRAGMENT_HEADER.size :]
+        if len(parts) == count:
+            self.unreliable_in = seq
+            self.fragments = {s: p for s, p in self.fragments.items() if s > seq}
+            self.dispatch(b"".join(parts[i] for i in range(count)))
+        elif len(self.fragments) > MAX_PARTIAL_FRAMES:
+            del self.fragments[min(self.fragments)]
+
+    def dispatch(self, body):
+        self.frame_size = DATAGRAM_HEADER.size + len(body)
+        data = decode_frame(body)
+        if type(data) is dict and "action" in data:
+            for n in ("Network_" + data["action"], "Network"):
+                if hasattr(self, n):
+                    getattr(self, n)(data)
+        else:
+            print("OOB data:", data)
+
+    def close(self):
+        if self.closed:
+            return
+        if self._transport is not None:
+            self._transport.sendto(DATAGRAM_HEADER.pack(KIND_DISCONNECT, 0), self.addr)
+        self.closed = True
+        if hasattr(self, "Close"):
+            self.Close()
+
+
+class LocalChannel:
+    # In-process channel without a socket, for benchmarks and tests. Queued
+    # frames are counted and discarded on Pump, and messages from the client
+    # side are delivered by calling receive() with the decoded dict.
+    protocol = 0
+
+    def __init__(self, server=None):
+        self._server = server
+        self.sendqueue = []
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.closed = False
+
+    def Send(self, data):
+        frame = encode_message(data, self.protocol)
+        self.SendFrame(frame, data["action"])
+        return len(frame)
+
+    def SendFrame(self, frame, action):
+        self.sendqueue.append(frame)
+
+    def Pump(self):
+        self.frames_sent += len(self.sendqueue)
+        self.bytes_sent += sum(len(frame) for frame in self.sendqueue)
+        self.sendqueue = []
+
+    def send_backlog(self):
+        return sum(len(frame) for frame in self.sendqueue)
+
+    def receive(self, data):
+        # As big as the frame the client would have sent
+        self.frame_size = len(encode_message(data, self.protocol))
+        for n in ("Network_" + data["action"], "Network"):
+            if hasattr(self, n):
+                getattr(self, n)(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if hasattr(self, "Close"):
+            self.Close()
+
+
+class LocalServer:
+    def __init__(self, game, localaddr, channel_class):
+        self.game = game
+        self.channel_class = channel_class
+        self.channels = []
+
+    def connect(self):
+        channel = self.channel_class(self.game)
+        self.channels.append(channel)
+        self.game.Connected(channel, ("local", len(self.channels)))
+        return channel
+
+    def Pump(self):
+        for channel in self.channels:
+            channel.Pump()
+        self.channels = [channel for channel in self.channels if not channel.closed]
+
+
+def step_loop(loop):
+    # Run every callback that is ready, including socket reads, without blocking
+    loop.call_soon(loop.stop)
+    loop.run_forever()
+
+
+def drain_loop(loop, protocol):
+    for _ in range(MAX_READ_STEPS):
+        received = protocol.received
+        step_loop(loop)
+        if protocol.received == received:
+            break
+
+
+class UdpServer(asyncio.DatagramProtocol):
+    def __init__(self, game, localaddr, channel_class):
+        self.game = game
+        self.channel_class = channel_class
+        self.channels = {}
+        self.received = 0
+        self.loop = asyncio.new_event_loop()
+        self.transport, _ = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(lambda: self, local_addr=localaddr)
+        )
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if len(data) < DATAGRAM_HEADER.size:
+            return
+
+        channel = self.channels.get(addr)
+        if channel is None:
+            if data[0] != KIND_CONNECT:
+                return
+            channel = self.channel_class(self.transport, addr, self.game)
+            self.channels[addr] = channel
+            channel.Send({"action": "connected"})
+            self.game.Connected(channel, addr)
+        channel.receive(data)
+
+    def error_received(self, exc):
+        # Send and ICMP errors surface here rather than at sendto
+        print(f"UDP error: {exc}")
+
+    def Pump(self):
+        for addr, channel in list(self.channels.items()):
+            channel.Pump()
+            if channel.closed:
+                del self.channels[addr]
+        drain_loop(self.loop, self)
+
+
+class UdpEndPoint(UdpChannel, asyncio.DatagramProtocol):
+    # Client side counterpart of PodSixNet's EndPoint: incoming messages are
+    # queued for GameClient.Pump to hand to Network_* methods
+    def __init__(self, address=("127.0.0.1", 31425), loop=None):
+        UdpChannel.__init__(self)
+        self.address = address
+        self.isConnected = False
+        self.queue = []
+        self.received = 0
+        self.shared_loop = loop
+        self.loop = None
+
+    def DoConnect(self, address=None):
+        if address:
+            self.address = address
+        UdpChannel.__init__(self)
+        self.loop = self.shared_loop or asyncio.new_event_loop()
+        try:
+            self._transport, _ = self.loop.run_until_complete(
+                self.loop.create_datagram_endpoint(
+                    lambda: self, remote_addr=self.address
+                )
+            )
+        except OSError as e:
+            self.loop = None
+            self.queue.append({"action": "error", "error": e.args})
+            return
+        self.send_control(KIND_CONNECT)
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if len(data) >= DATAGRAM_HEADER.size:
+            self.receive(data)
+
+    def error_received(self, exc):
+        self.queue.append({"action": "error", "error": exc.args})
+
+    def GetQueue(self):
+        return self.queue
+
+    def Pump(self):
+        self.Flush()
+        if self.loop is not None:
+            drain_loop(self.loop, self)
+
+    def Flush(self):
+        # Pump without reading, for endpoints sharing an event loop
+        self.queue = []
+        if self.loop is None:
+            return
+
+        now = time.monotonic()
+        if not self.isConnected and now - self.last_sent > RESEND_INTERVAL:
+            self.send_control(KIND_CONNECT)
+        UdpChannel.Pump(self)
+
+    def Close(self):
+        self.isConnected = False
+        self.queue.append({"action": "disconnected"})
+
+    def Network_connected(self, data):
+        self.isConnected = True
+
+    def Network(self, data):
+        self.queue.append(data)
+
+
+class EndPointGroup:
+    # Client endpoints pumped together, for running many clients in one
+    # process: their sockets share one asyncore map (TCP) or one event loop
+    # (UDP), which is polled once per Pump instead of once per endpoint.
+    # Dispatch each endpoint's queue before calling Pump, which clears it.
+    def __init__(self, transport="tcp"):
+        self.transport = transport
+        self.endpoints = []
+        self.map = {}
+        self.loop = asyncio.new_event_loop() if transport == "udp" else None
+
+    @property
+    def received(self):
+        return sum(endpoint.received for endpoint in self.endpoints)
+
+    def endpoint(self):
+        if self.transport == "udp":
+            endpoint = UdpEndPoint(loop=self.loop)
+        else:
+            endpoint = TcpEndPoint(map=self.map)
+        self.endpoints.append(endpoint)
+        return endpoint
+
+    def Pump(self):
+        for endpoint in self.endpoints:
+            endpoint.Flush()
+        if self.loop is not None:
+            drain_loop(self.loop, self)
+        else:
+            poll(map=self.map)